@@ -0,0 +1,131 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows: sem medição de pico de memória
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gerar_efd import FILHOS, contagens_para_linhas, gerar_efd
+
+# Mede o processador em arquivos sintéticos de tamanhos crescentes e por tipo de registro.
+#   python benchmarks/benchmark_parser.py --tamanhos 10000 100000 1000000 10000000 --saida resultados.json
+# Cada medição roda num processo novo, para que o pico de RSS seja só daquela execução.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do processador de EFD Contribuições.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--linhas-por-registro", type=int, default=200_000,
+                        help="Tamanho dos arquivos usados no custo por registro (0 desliga)")
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--diretorio", default=os.path.join("benchmarks", "arquivos"),
+                        help="Onde os arquivos sintéticos são gerados e reaproveitados")
+    parser.add_argument("--saida", default=os.path.join("benchmarks", "resultados.json"))
+    args = parser.parse_args()
+    os.makedirs(args.diretorio, exist_ok=True)
+
+    resultados = {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_atual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'tamanhos': [],
+        'por_registro': {},
+    }
+
+    for linhas in args.tamanhos:
+        caminho, totais = preparar_arquivo(args.diretorio, f"mistura_{linhas}", contagens_para_linhas(linhas))
+        medicao = medir(caminho, totais, args.repeticoes)
+        resultados['tamanhos'].append(medicao)
+        print(f"{medicao['linhas']:>10} linhas  {medicao['linhas_por_s']:>12,.0f} linhas/s  "
+              f"{medicao['linhas_resultado_por_s']:>12,.0f} linhas resultado/s  pico {medicao['pico_rss_mb']} MB")
+
+    if args.linhas_por_registro:
+        # Um arquivo por tipo de documento, só com ele e o bloco 0: custo médio por linha daquele registro
+        for codigo in FILHOS:
+            contagens = contagens_para_linhas(args.linhas_por_registro, mistura={codigo: 1})
+            caminho, totais = preparar_arquivo(args.diretorio, f"registro_{codigo}_{args.linhas_por_registro}", contagens)
+            medicao = medir(caminho, totais, args.repeticoes)
+            linhas_registro = sum(totais.get(c, 0) for c in [codigo] + FILHOS[codigo])
+            medicao['us_por_linha_registro'] = round(medicao['segundos'] / linhas_registro * 1e6, 3)
+            resultados['por_registro'][codigo] = medicao
+            print(f"{codigo}/{'/'.join(FILHOS[codigo]) or '-':<10} {medicao['us_por_linha_registro']:>8} µs/linha")
+
+    os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {args.saida}")
+
+def preparar_arquivo(diretorio, nome, contagens):
+    # O gerador é determinístico, então arquivos já gerados com as mesmas contagens são reaproveitados
+    caminho = os.path.join(diretorio, f"{nome}.txt")
+    caminho_totais = caminho + ".json"
+    if os.path.exists(caminho) and os.path.exists(caminho_totais):
+        with open(caminho_totais, encoding='utf-8') as arquivo:
+            salvo = json.load(arquivo)
+        if salvo['contagens'] == contagens:
+            return caminho, salvo['totais']
+    totais = gerar_efd(caminho, contagens)
+    with open(caminho_totais, 'w', encoding='utf-8') as arquivo:
+        json.dump({'contagens': contagens, 'totais': totais}, arquivo)
+    return caminho, totais
+
+def medir(caminho, totais, repeticoes):
+    contexto = multiprocessing.get_context("spawn")
+    execucoes = []
+    for _ in range(repeticoes):
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+            execucoes.append(pool.submit(medir_processo, caminho).result())
+    melhor = min(execucoes, key=lambda execucao: execucao['segundos'])
+    linhas = sum(totais.values())
+    return {
+        'arquivo': os.path.basename(caminho),
+        'linhas': linhas,
+        'bytes': os.path.getsize(caminho),
+        'linhas_resultado': melhor['linhas_resultado'],
+        'segundos': round(melhor['segundos'], 4),
+        'linhas_por_s': round(linhas / melhor['segundos'], 1),
+        'linhas_resultado_por_s': round(melhor['linhas_resultado'] / melhor['segundos'], 1),
+        'mb_por_s': round(os.path.getsize(caminho) / melhor['segundos'] / 2**20, 2),
+        'pico_rss_mb': max((execucao['pico_rss_mb'] or 0) for execucao in execucoes) or None,
+        'rss_base_mb': melhor['rss_base_mb'],
+        'repeticoes': [round(execucao['segundos'], 4) for execucao in execucoes],
+    }
+
+def medir_processo(caminho):
+    # Executado no processo filho: importa o processador, mede o tempo e o pico de memória
+    from processador_efd import processar_caminho
+    base = pico_rss_mb()
+    inicio = time.perf_counter()
+    df = processar_caminho(caminho)
+    segundos = time.perf_counter() - inicio
+    return {'segundos': segundos, 'linhas_resultado': len(df), 'pico_rss_mb': pico_rss_mb(), 'rss_base_mb': base}
+
+def pico_rss_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return round(pico / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    main()
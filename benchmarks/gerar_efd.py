@@ -0,0 +1,159 @@
+import argparse
+import random
+from collections import Counter
+
+# Gerador determinístico de arquivos EFD Contribuições sintéticos, para medir o processador.
+#   python benchmarks/gerar_efd.py saida.txt --linhas 1000000
+#   python benchmarks/gerar_efd.py saida.txt --contagem C100=5000 --itens C100=6 --contagem 0150=300
+
+# Registros filhos emitidos a cada item de cada documento (na ordem em que aparecem no arquivo)
+FILHOS = {
+    'A100': ['A170'],
+    'C100': ['C170'],
+    'C500': ['C501', 'C505'],
+    'D100': ['D101', 'D105'],
+    'D200': ['D201', 'D205'],
+    'D500': ['D501', 'D505'],
+    'F100': [],
+}
+BLOCOS = {'A100': 'A', 'C100': 'C', 'C500': 'C', 'D100': 'D', 'D200': 'D', 'D500': 'D', 'F100': 'F'}
+
+ITENS_PADRAO = {'A100': 3, 'C100': 4, 'C500': 1, 'D100': 1, 'D200': 1, 'D500': 1, 'F100': 0}
+
+# Proporção de documentos usada quando só o total de linhas é informado
+MISTURA_PADRAO = {'A100': 1, 'C100': 10, 'C500': 1, 'D100': 1, 'D200': 1, 'D500': 1, 'F100': 2}
+
+CNPJ = '12345678000199'
+
+
+def contagens_para_linhas(linhas, mistura=MISTURA_PADRAO, itens=ITENS_PADRAO):
+    # Escala a mistura de documentos para chegar perto do total de linhas pedido
+    por_unidade = sum(peso * (1 + itens[codigo] * len(FILHOS[codigo])) for codigo, peso in mistura.items())
+    unidades = max(linhas // por_unidade, 1)
+    contagens = {codigo: peso * unidades for codigo, peso in mistura.items()}
+    documentos = sum(contagens.values())
+    contagens['0150'] = min(max(documentos // 20, 10), 50000)
+    contagens['0200'] = min(max(documentos // 10, 10), 100000)
+    return contagens
+
+def gerar_efd(destino, contagens, itens=ITENS_PADRAO, semente=0):
+    # Escreve em fluxo, sem montar o arquivo em memória; retorna a quantidade de linhas por registro
+    r = random.Random(semente)
+    valores = [f"{r.randint(1, 100000)},{r.randint(0, 99):02d}" for _ in range(997)]
+    inteiros = [str(r.randint(1, 1000)) for _ in range(991)]
+    n_participantes = max(contagens.get('0150', 0), 1)
+    n_produtos = max(contagens.get('0200', 0), 1)
+    totais = Counter()
+
+    with open(destino, 'w', encoding='latin-1', newline='') as arquivo:
+        bloco = []
+
+        def emitir(linha):
+            totais[linha[1:5]] += 1
+            bloco.append(linha)
+            if len(bloco) >= 10000:
+                descarregar()
+
+        def descarregar():
+            arquivo.write('\r\n'.join(bloco))
+            arquivo.write('\r\n')
+            bloco.clear()
+
+        def v():
+            return valores[r.randrange(997)]
+
+        def vi():
+            return inteiros[r.randrange(991)]
+
+        def participante():
+            return f"P{r.randrange(n_participantes)}"
+
+        def produto():
+            return f"I{r.randrange(n_produtos)}"
+
+        def fechar_bloco(letra):
+            emitir(f"|{letra}990|{sum(totais[c] for c in totais if c[0] == letra) + 1}|")
+
+        emitir(f"|0000|006|0|||01012024|31012024|EMPRESA SINTETICA|{CNPJ}|SP|3550308||00|1|")
+        emitir("|0001|0|")
+        emitir("|0110|1|1|1||")
+        municipios = ["3550308", "3304557", "4106902", "5300108"]
+        for i in range(contagens.get('0150', 0)):
+            emitir(f"|0150|P{i}|PARTICIPANTE {i}|01058|{i:014d}||ISENTO|{municipios[i % 4]}||RUA|{i}||CENTRO|")
+        for i in range(contagens.get('0200', 0)):
+            emitir(f"|0200|I{i}|PRODUTO {i}|789{i:010d}||UN|00|12345678|||01.01|18,00|")
+        fechar_bloco('0')
+
+        documento = 0
+        for letra in 'ACDF':
+            codigos = [codigo for codigo in FILHOS if BLOCOS[codigo] == letra and contagens.get(codigo, 0)]
+            emitir(f"|{letra}001|{1 if not codigos else 0}|")
+            if letra in 'CDF':
+                emitir(f"|{letra}010|{CNPJ}|" + ("2|" if letra == 'C' else ""))
+            for codigo in codigos:
+                n_itens = itens.get(codigo, ITENS_PADRAO[codigo])
+                for _ in range(contagens[codigo]):
+                    documento += 1
+                    d = documento
+                    if codigo == 'A100':
+                        emitir(f"|A100|0|1|{participante()}|00|1||{d}|CHV{d}|05012024|06012024|{v()}|1|0|{v()}|{v()}|{v()}|{v()}|0|0|{v()}|")
+                        for k in range(n_itens):
+                            emitir(f"|A170|{k + 1}|{produto()}|SERVICO|{v()}|0|13|0|50|{v()}|1,65|{vi()}|50|{v()}|7,6|{vi()}|CTA1||")
+                    elif codigo == 'C100':
+                        emitir(f"|C100|0|1|{participante()}|55|00|1|{d}|{d:044d}|10012024|11012024|{v()}|1|{v()}|0|{v()}|0|{v()}|0|0|{v()}|{v()}|0|0|0|{v()}|{v()}|0|0|")
+                        for k in range(n_itens):
+                            emitir(f"|C170|{k + 1}|{produto()}|COMPL|10|UN|{v()}|0|0|000|1102|04|{v()}|18,00|{v()}|0|0|0|0|50||0|0|0|50|{v()}|1,65|||{vi()}|50|{v()}|7,60|||{vi()}|CTA|")
+                    elif codigo == 'C500':
+                        emitir(f"|C500|{participante()}|06|00|1||{d}|15012024|16012024|{v()}|{v()}||{v()}|{v()}||")
+                        for _ in range(n_itens):
+                            emitir(f"|C501|50|{v()}|04|{v()}|1,65|{v()}|CTA|")
+                            emitir(f"|C505|50|{v()}|04|{v()}|7,6|{v()}|CTA|")
+                    elif codigo == 'D100':
+                        emitir(f"|D100|0|1|{participante()}|57|00|1||{d}|CTE{d}|20012024|21012024|0||{v()}|0|1|{v()}|{v()}|{v()}|0|||")
+                        for _ in range(n_itens):
+                            emitir(f"|D101|0|{v()}|50|07|{v()}|1,65|{v()}|CTA|")
+                            emitir(f"|D105|0|{v()}|50|07|{v()}|7,6|{v()}|CTA|")
+                    elif codigo == 'D200':
+                        emitir(f"|D200|57|00|1||{d}|{d + 5}|5353|22012024|{v()}|0|")
+                        for _ in range(n_itens):
+                            emitir(f"|D201|01|{v()}|{v()}|1,65|{vi()}|CTA|")
+                            emitir(f"|D205|01|{v()}|{v()}|7,6|{vi()}|CTA|")
+                    elif codigo == 'D500':
+                        emitir(f"|D500|0|1|{participante()}|22|00|1||{d}|23012024|24012024|{v()}|0|{v()}|0|0|0|{v()}|{v()}||{v()}|{v()}|")
+                        for _ in range(n_itens):
+                            emitir(f"|D501|50|{v()}|03|{v()}|1,65|{v()}|CTA|")
+                            emitir(f"|D505|50|{v()}|03|{v()}|7,6|{v()}|CTA|")
+                    else:
+                        emitir(f"|F100|0|{participante()}|{produto()}|25012024|{v()}|50|{v()}|1,65|{v()}|50|{v()}|7,6|{v()}|13|0|CTA||OPERACAO|")
+            fechar_bloco(letra)
+
+        emitir("|M001|1|")
+        emitir("|M990|2|")
+        emitir("|9001|0|")
+        registros = sorted(totais) + ['9900', '9990', '9999']
+        for codigo in registros:
+            quantidade = {'9900': len(registros), '9990': 1, '9999': 1}.get(codigo, totais[codigo])
+            emitir(f"|9900|{codigo}|{quantidade}|")
+        emitir(f"|9990|{len(registros) + 3}|")
+        emitir(f"|9999|{sum(totais.values()) + 1}|")
+        descarregar()
+
+    return dict(totais)
+
+def ler_pares(pares):
+    return {codigo: int(valor) for codigo, valor in (par.split('=', 1) for par in pares)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera um arquivo EFD Contribuições sintético.")
+    parser.add_argument("destino")
+    parser.add_argument("--linhas", type=int, help="Total aproximado de linhas, com a mistura padrão")
+    parser.add_argument("--contagem", action="append", default=[], help="REGISTRO=quantidade (0150, 0200 ou documento)")
+    parser.add_argument("--itens", action="append", default=[], help="DOCUMENTO=itens por documento")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    contagens = contagens_para_linhas(args.linhas) if args.linhas else {}
+    contagens.update(ler_pares(args.contagem))
+    totais = gerar_efd(args.destino, contagens, {**ITENS_PADRAO, **ler_pares(args.itens)}, args.semente)
+    print(f"{sum(totais.values())} linhas gravadas em {args.destino}")
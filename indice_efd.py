@@ -0,0 +1,158 @@
+import hashlib
+import os
+import re
+import uuid
+
+import numpy as np
+
+# Índice de posições (bytes) de um arquivo EFD: início de cada bloco (|X001| e |X990|),
+# de cada registro de documento e dos cadastros de participantes e itens do bloco 0.
+# Com um diretório informado (ex.: o do cache), fica gravado num arquivo .npz, criado na
+# primeira leitura; sem ele, vale só para a leitura atual e nada é gravado junto dos
+# arquivos do usuário. Permite ler só os trechos de interesse pelo mmap.
+
+# Incrementar ao mudar o conteúdo do índice, para descartar os já gravados
+VERSAO_INDICE = 2
+
+# Delimitadores de bloco, sempre indexados junto com os registros pedidos
+MARCADORES = rb'[0-9A-Z](?:001|990)'
+
+
+def caminho_indice(caminho, diretorio):
+    # Nome único em 'diretorio', derivado do caminho completo do arquivo
+    identificador = hashlib.sha1(os.path.abspath(caminho).encode()).hexdigest()[:16]
+    return os.path.join(diretorio, f"{os.path.basename(caminho)}.{identificador}.indice.npz")
+
+def obter_indice(caminho, conteudo, codigos, diretorio=None):
+    # Lê o índice gravado em 'diretorio' se ainda corresponder ao arquivo (tamanho, data de
+    # modificação e registros indexados); senão cria a partir de 'conteudo' (mmap do arquivo)
+    # e grava. Sem 'diretorio', só cria.
+    if diretorio is None:
+        return construir_indice(conteudo, codigos)
+    estado = os.stat(caminho)
+    assinatura = [VERSAO_INDICE, estado.st_size, estado.st_mtime_ns]
+    destino = caminho_indice(caminho, diretorio)
+    indice = ler_arrays(destino)
+    if indice is not None and indice.pop('assinatura').tolist() == assinatura:
+        indice.pop('origem', None)
+        if set(codigos) <= set(indice):
+            # O mtime marca o último uso, como nos resultados do cache
+            try:
+                os.utime(destino)
+            except OSError:
+                pass
+            return indice
+
+    indice = construir_indice(conteudo, codigos)
+    try:
+        # 'origem' permite reconhecer os índices de arquivos que já não existem (ver origem_indice)
+        gravar_arrays(destino, {
+            'assinatura': np.array(assinatura, dtype=np.int64),
+            'origem': np.array(os.path.abspath(caminho)),
+            **indice,
+        })
+    except OSError as e:
+        # Diretório somente leitura: o índice vale só para esta leitura
+        print(f"Índice não gravado em {destino}: {e}")
+    return indice
+
+def origem_indice(destino):
+    # Caminho do arquivo EFD de um índice gravado, ou None se ilegível ou de versão anterior
+    try:
+        with np.load(destino) as arquivo:
+            return str(arquivo['origem']) if 'origem' in arquivo.files else None
+    except (OSError, ValueError):
+        return None
+
+def construir_indice(conteudo, codigos):
+    # Uma única busca (em C) pelas linhas dos registros: código -> posições (int64) em ordem
+    padrao = re.compile(
+        rb'^\|(' + b'|'.join(re.escape(codigo.encode('ascii')) for codigo in codigos) + rb'|' + MARCADORES + rb')\|',
+        re.MULTILINE,
+    )
+    posicoes = {codigo: [] for codigo in codigos}
+    for encontrado in padrao.finditer(conteudo):
+        posicoes.setdefault(encontrado.group(1).decode('ascii'), []).append(encontrado.start())
+    return {codigo: np.array(lista, dtype=np.int64) for codigo, lista in posicoes.items()}
+
+def ler_arrays(destino):
+    # Conteúdo de um .npz (índice ou assinatura) como dicionário, ou None se ausente/inválido
+    try:
+        with np.load(destino) as arquivo:
+            return {chave: arquivo[chave] for chave in arquivo.files}
+    except (OSError, ValueError):
+        return None
+
+def gravar_arrays(destino, arrays):
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    # Nome único por gravação (processos ou threads gravando o mesmo destino); o np.savez
+    # acrescenta .npz a nomes sem a extensão
+    temporario = f"{destino}.{uuid.uuid4().hex}.tmp.npz"
+    try:
+        np.savez(temporario, **arrays)
+        os.replace(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+def fim_bloco_0(indice, conteudo):
+    # Posição logo após a linha |0990|, ou None se o índice não tiver o bloco 0 fechado
+    if not len(indice.get('0990', ())):
+        return None
+    return conteudo.find(b'\n', int(indice['0990'][0])) + 1 or len(conteudo)
+
+def trechos_documentos(indice, conteudo, documentos):
+    # (códigos, inícios, fins) dos registros 'documentos' em ordem no arquivo: cada um
+    # vai até a próxima posição indexada, o que inclui os seus filhos
+    codigos = [codigo for codigo in documentos if codigo in indice]
+    inicios = np.concatenate([indice[codigo] for codigo in codigos] or [np.array([], dtype=np.int64)])
+    registros = np.repeat(np.array(codigos, dtype='<U4'), [len(indice[codigo]) for codigo in codigos])
+    ordem = np.argsort(inicios, kind='stable')
+    inicios, registros = inicios[ordem], registros[ordem]
+    limites = np.unique(np.concatenate(list(indice.values())))
+    fins = np.append(limites, len(conteudo))[np.searchsorted(limites, inicios, side='right')]
+    return registros, inicios, fins
+
+def assinar_documentos(indice, conteudo, documentos):
+    # Assinatura para o reprocessamento incremental: um hash dos cadastros (CNPJ, período
+    # e bloco 0 sem o 0000, que muda na retificadora) e um hash por documento com seus
+    # filhos. Sem o bloco 0 fechado não há assinatura (None).
+    fim = fim_bloco_0(indice, conteudo)
+    if fim is None:
+        return None
+    inicio_cadastros = conteudo.find(b'\n') + 1
+    campos = conteudo[:inicio_cadastros].split(b'|')
+    cadastros = hashlib.blake2b(b'|'.join(campos[6:8] + campos[9:10]), digest_size=8)
+    cadastros.update(conteudo[inicio_cadastros:fim])
+
+    registros, inicios, fins = trechos_documentos(indice, conteudo, documentos)
+    # O memoryview evita copiar cada trecho do mmap antes de calcular o hash
+    with memoryview(conteudo) as visao:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(visao[inicio:fim], digest_size=8).digest(), 'little')
+             for inicio, fim in zip(inicios.tolist(), fins.tolist())),
+            dtype=np.uint64, count=len(inicios),
+        )
+    return {
+        'cadastros': np.frombuffer(cadastros.digest(), dtype=np.uint64),
+        'registros': registros,
+        'inicios': inicios,
+        'fins': fins,
+        'hashes': hashes,
+    }
+
+def intervalos_documentos(indice, conteudo, documentos):
+    # Trechos [início, fim) com o bloco 0 e os registros 'documentos' (cada um até a
+    # próxima posição indexada, o que inclui os seus filhos), em ordem e já unidos.
+    # Sem o |0990| no índice, o arquivo é lido inteiro.
+    fim = fim_bloco_0(indice, conteudo)
+    if fim is None:
+        return [(0, len(conteudo))]
+    _, inicios, fins = trechos_documentos(indice, conteudo, documentos)
+    intervalos = [[0, fim]]
+    for inicio, fim in zip(inicios.tolist(), fins.tolist()):
+        if inicio <= intervalos[-1][1]:
+            intervalos[-1][1] = max(intervalos[-1][1], fim)
+        else:
+            intervalos.append([inicio, fim])
+    return [tuple(intervalo) for intervalo in intervalos]
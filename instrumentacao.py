@@ -0,0 +1,179 @@
+import math
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Instrumentação opcional do processamento: tempo (total e p99), chamadas e bytes
+# alocados por fase e por tratador de registro. Os tempos vão para histogramas
+# logarítmicos, que podem ser somados entre arquivos e processos de trabalho.
+
+# Subdivisões por potência de 2 nos histogramas (~9% de resolução no p99)
+DIVISOES = 8
+
+
+class Perfil:
+    def __init__(self, memoria=False):
+        self.memoria = memoria
+        # (grupo, nome) -> [chamadas, total em ns, bytes alocados, histograma]
+        self.medidas = {}
+
+    def registrar(self, grupo, nome, duracao, alocado=0):
+        medida = self.medidas.get((grupo, nome))
+        if medida is None:
+            medida = self.medidas[(grupo, nome)] = [0, 0, 0, Counter()]
+        medida[0] += 1
+        medida[1] += duracao
+        medida[2] += max(alocado, 0)
+        medida[3][int(math.log2(duracao) * DIVISOES) if duracao > 0 else 0] += 1
+
+    def memoria_atual(self):
+        return tracemalloc.get_traced_memory()[0] if self.memoria else 0
+
+    @contextmanager
+    def rastrear_memoria(self):
+        # Liga o tracemalloc só durante a medição, se ainda não estiver ligado
+        iniciar = self.memoria and not tracemalloc.is_tracing()
+        if iniciar:
+            tracemalloc.start()
+        try:
+            yield
+        finally:
+            if iniciar:
+                tracemalloc.stop()
+
+    @contextmanager
+    def fase(self, nome):
+        with self.rastrear_memoria():
+            memoria = self.memoria_atual()
+            inicio = time.perf_counter_ns()
+            try:
+                yield
+            finally:
+                self.registrar('fases', nome, time.perf_counter_ns() - inicio, self.memoria_atual() - memoria)
+
+    def iterar(self, nome, iteravel):
+        # Mede o tempo gasto para obter cada elemento (ex.: leitura das linhas)
+        iterador = iter(iteravel)
+        while True:
+            memoria = self.memoria_atual()
+            inicio = time.perf_counter_ns()
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                return
+            self.registrar('fases', nome, time.perf_counter_ns() - inicio, self.memoria_atual() - memoria)
+            yield elemento
+
+    def instrumentar(self, registros):
+        # Cópia da tabela de registros com cada tratador envolvido por uma medição
+        return {
+            codigo: (self.medir_tratador(codigo, tratador), *opcoes)
+            for codigo, (tratador, *opcoes) in registros.items()
+        }
+
+    def medir_tratador(self, codigo, tratador):
+        def medido(line, estado):
+            memoria = self.memoria_atual()
+            inicio = time.perf_counter_ns()
+            resultado = tratador(line, estado)
+            self.registrar('registros', codigo, time.perf_counter_ns() - inicio, self.memoria_atual() - memoria)
+            return resultado
+        return medido
+
+    def combinar(self, outro):
+        for chave, (chamadas, total, alocado, histograma) in outro.medidas.items():
+            medida = self.medidas.setdefault(chave, [0, 0, 0, Counter()])
+            medida[0] += chamadas
+            medida[1] += total
+            medida[2] += alocado
+            medida[3].update(histograma)
+        return self
+
+    def resumo(self):
+        resumo = {'fases': {}, 'registros': {}}
+        for (grupo, nome), (chamadas, total, alocado, histograma) in sorted(self.medidas.items()):
+            resumo[grupo][nome] = {
+                'chamadas': chamadas,
+                'total_s': round(total / 1e9, 6),
+                'p99_ms': round(percentil(histograma, chamadas, 0.99) / 1e6, 6),
+                'bytes_alocados': alocado if self.memoria else None,
+            }
+
+        # Fases derivadas da passagem pelas linhas: bloco 0 e documentos (o que não é leitura nem bloco 0)
+        passagem = resumo['fases'].get('passagem')
+        if passagem:
+            bloco_0 = [medida for codigo, medida in resumo['registros'].items() if codigo.startswith('0')]
+            resumo['fases']['bloco 0'] = somar(bloco_0)
+            leitura = resumo['fases'].get('leitura', somar([]))
+            resumo['fases']['documentos'] = {
+                'chamadas': passagem['chamadas'],
+                'total_s': round(passagem['total_s'] - leitura['total_s'] - resumo['fases']['bloco 0']['total_s'], 6),
+                'p99_ms': None,
+                'bytes_alocados': None if passagem['bytes_alocados'] is None else max(
+                    passagem['bytes_alocados'] - leitura['bytes_alocados'] - resumo['fases']['bloco 0']['bytes_alocados'], 0),
+            }
+        return resumo
+
+class ProcessamentoCancelado(Exception):
+    pass
+
+class Progresso:
+    # Andamento de um arquivo (ou trecho) processado em segundo plano. 'andamento' é um
+    # dicionário compartilhado entre processos (multiprocessing.Manager().dict()): cada
+    # parte grava (linhas lidas, bytes lidos, linhas geradas, bytes previstos) na sua chave,
+    # e um valor verdadeiro em 'cancelado' interrompe o processamento na próxima atualização.
+    def __init__(self, andamento, chave, a_cada=20000):
+        self.andamento = andamento
+        self.chave = chave
+        self.a_cada = a_cada
+        self.previstos = None
+
+    def parte(self, numero):
+        # Progresso de um trecho do mesmo arquivo (processamento por bloco)
+        return Progresso(self.andamento, f"{self.chave}/{numero}", self.a_cada)
+
+    def prever(self, previstos):
+        # Bytes que serão de fato lidos (só os trechos selecionados), base da fração concluída
+        self.previstos = previstos
+        self.andamento[self.chave] = (0, 0, 0, previstos)
+
+    def acompanhar(self, linhas, contar_geradas):
+        # Repassa as linhas uma a uma, sem ler adiante: quem gera as linhas pode contar com
+        # a anterior já tratada ao ser pedida a próxima (ver processar_incremental).
+        # Atualiza o andamento a cada 'a_cada' linhas; 'contar_geradas' devolve as linhas de saída
+        lidas = lidos = 0
+        for linha in linhas:
+            yield linha
+            lidas += 1
+            lidos += len(linha) + 1
+            if lidas % self.a_cada == 0:
+                self.atualizar(lidas, lidos, contar_geradas())
+        self.atualizar(lidas, lidos, contar_geradas())
+
+    def atualizar(self, lidas, lidos, geradas):
+        if self.andamento.get('cancelado'):
+            raise ProcessamentoCancelado("processamento cancelado")
+        self.andamento[self.chave] = (lidas, lidos, geradas, self.previstos)
+
+def percentil(histograma, chamadas, fracao):
+    # Limite superior da faixa do histograma onde o percentil cai, em ns
+    acumulado = 0
+    for faixa in sorted(histograma):
+        acumulado += histograma[faixa]
+        if acumulado >= chamadas * fracao:
+            return 2 ** ((faixa + 1) / DIVISOES)
+    return 0
+
+def somar(medidas):
+    return {
+        'chamadas': sum(medida['chamadas'] for medida in medidas),
+        'total_s': round(sum(medida['total_s'] for medida in medidas), 6),
+        'p99_ms': None,
+        'bytes_alocados': None if any(medida['bytes_alocados'] is None for medida in medidas)
+        else sum(medida['bytes_alocados'] for medida in medidas),
+    }
+
+def fase(perfil, nome):
+    # Atalho para medir uma fase só quando há instrumentação
+    return perfil.fase(nome) if perfil else nullcontext()
@@ -0,0 +1,1247 @@
+import io
+import mmap
+import os
+import sys
+from array import array
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from collections import deque
+
+from indice_efd import assinar_documentos, construir_indice, fim_bloco_0, intervalos_documentos, ler_arrays, obter_indice
+from instrumentacao import Perfil, fase
+
+
+# As linhas são lidas e despachadas em bytes: registros sem tratador são descartados
+# sem decodificação, e os tratadores decodificam só as linhas que usam (ver Leiaute.dividir).
+ENCODING = "ISO-8859-1"
+
+def ler_linhas(arquivo):
+    # Gera as linhas (bytes, sem quebra de linha) de um arquivo binário (ex.: UploadedFile)
+    arquivo.seek(0)
+    for line in arquivo:
+        yield line.rstrip(b'\r\n')
+
+def arquivo_vazio(caminho):
+    # O mmap não aceita arquivos vazios: esses são processados como bytes vazios
+    return os.path.getsize(caminho) == 0
+
+def mapear_arquivo(caminho):
+    # Mapeia o arquivo em memória somente leitura; o mapa continua válido após fechar o arquivo
+    with open(caminho, 'rb') as arquivo:
+        return mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+def ler_linhas_mapa(mapa, inicio=0, fim=None):
+    # Gera as linhas (bytes) de um trecho [inicio, fim) do mapa
+    fim = len(mapa) if fim is None else fim
+    mapa.seek(inicio)
+    while mapa.tell() < fim:
+        yield mapa.readline().rstrip(b'\r\n')
+
+def ler_selecao(conteudo, familias=None, fim=None):
+    # Linhas de [0, fim) de um arquivo em bytes ou mmap. Com 'familias', os blocos de
+    # documentos sem nenhuma família selecionada são pulados por inteiro (de |X001| a |X990|)
+    fim = len(conteudo) if fim is None else fim
+    intervalos = []
+    inicio = 0
+    for inicio_bloco, fim_bloco in blocos_ignorados(conteudo, familias):
+        if inicio_bloco >= fim:
+            break
+        intervalos.append((inicio, inicio_bloco))
+        inicio = fim_bloco
+    intervalos.append((inicio, fim))
+    return ler_intervalos(conteudo, intervalos)
+
+def ler_intervalos(conteudo, intervalos):
+    # Linhas dos trechos [inicio, fim) de um arquivo em bytes ou mmap, na ordem dada
+    leitor = conteudo if isinstance(conteudo, mmap.mmap) else io.BytesIO(conteudo)
+    for inicio, fim in intervalos:
+        yield from ler_linhas_mapa(leitor, inicio, fim)
+
+def processar_caminho(caminho, perfil=None, familias=None, diretorio_indice=None, progresso=None):
+    # Ponto de entrada dos processos de trabalho para arquivos no disco do servidor.
+    # O índice de posições (indice_efd) é gravado em 'diretorio_indice' na primeira leitura
+    # (sem ele, é criado a cada leitura); com 'familias', só o bloco 0 e os documentos
+    # selecionados são lidos, indo direto às suas posições no mmap.
+    if arquivo_vazio(caminho):
+        return processar_bytes(b'', perfil, familias, progresso)
+    mapa = mapear_arquivo(caminho)
+    try:
+        with fase(perfil, 'índice'):
+            indice = obter_indice(caminho, mapa, CODIGOS_INDICE, diretorio_indice)
+        intervalos = [(0, len(mapa))] if familias is None else intervalos_documentos(indice, mapa, familias)
+        if progresso:
+            progresso.prever(sum(fim - inicio for inicio, fim in intervalos))
+        return processar_arquivo(ler_intervalos(mapa, intervalos), perfil=perfil, familias=familias, progresso=progresso)
+    finally:
+        mapa.close()
+
+def processar_bytes(conteudo, perfil=None, familias=None, progresso=None):
+    # Ponto de entrada dos processos de trabalho: recebe o arquivo EFD em bytes
+    if progresso:
+        progresso.prever(len(conteudo) - sum(fim - inicio for inicio, fim in blocos_ignorados(conteudo, familias)))
+    return processar_arquivo(ler_selecao(conteudo, familias), perfil=perfil, familias=familias, progresso=progresso)
+
+def processar_arquivo(linhas, contexto=None, perfil=None, familias=None, progresso=None):
+    # Passagem única: o bloco 0 alimenta os índices à medida que é lido e as
+    # referências ainda não conhecidas ficam pendentes até o fim do bloco 0
+    # (|0990|) ou do arquivo. Aceita qualquer iterável de linhas em bytes; 'contexto'
+    # (ver extrair_contexto) permite processar um trecho sem o seu bloco 0.
+    # Os totais de resumo (ver AcumuladorSaida.resumir) voltam em df.attrs['resumo'], as
+    # contagens de linhas inválidas e referências não encontradas em df.attrs['inconsistencias']
+    # e, com 'perfil' (instrumentacao.Perfil), as medições voltam em df.attrs['perfil'].
+    # 'familias' (códigos de FAMILIAS) restringe os documentos extraídos e 'progresso'
+    # (instrumentacao.Progresso) publica o andamento para processamentos em segundo plano.
+    if not perfil:
+        return processar_passagem(linhas, contexto, familias=familias, progresso=progresso)
+    with perfil.rastrear_memoria():
+        df = processar_passagem(perfil.iterar('leitura', linhas), contexto, perfil, familias, progresso)
+    df.attrs['perfil'] = perfil
+    return df
+
+def processar_passagem(linhas, contexto=None, perfil=None, familias=None, progresso=None):
+    estado = novo_estado(contexto)
+    if progresso:
+        linhas = progresso.acompanhar(linhas, lambda: len(estado['saida'].documento_do_item))
+    registros = selecionar_registros(familias)
+    if perfil:
+        registros = perfil.instrumentar(registros)
+    with fase(perfil, 'passagem'):
+        processar_linhas(linhas, estado, registros)
+        pendentes = resolver_pendencias(estado)
+        avisar_pendencias(pendentes)
+
+    with fase(perfil, 'montagem DataFrame'):
+        df = estado['saida'].montar()
+        df.attrs['resumo'] = estado['saida'].resumir(estado['participantes'])
+    df.attrs['inconsistencias'] = contar_inconsistencias(estado, pendentes)
+    return df
+
+def avisar_pendencias(pendentes):
+    for tipo, codigo in sorted({(tipo, codigo) for tipo, codigo, _, _ in pendentes}):
+        print(f"{tipo} {codigo} não encontrado no bloco 0")
+
+def contar_inconsistencias(estado, pendentes):
+    # Linhas descartadas por falta de campos e linhas com participante/item ausente do bloco 0
+    return {'linhas_invalidas': estado['invalidas'], 'referencias_pendentes': len(pendentes)}
+
+def combinar_inconsistencias(contagens):
+    return {chave: sum(contagem[chave] for contagem in contagens) for chave in contagens[0]}
+
+def novo_estado(contexto=None):
+    estado = {
+        '0000': Cabecalho(),
+        'participantes': {},
+        'produtos': {},
+        'pendentes': [],
+        'invalidas': 0,
+        'saida': AcumuladorSaida(),
+    }
+    if contexto:
+        estado.update(contexto)
+    return estado
+
+def processar_linhas(linhas, estado, registros=None):
+    saida = estado['saida']
+    # Consulta pelo código ainda em bytes, para não decodificar as linhas ignoradas
+    tabela = {codigo.encode('ascii'): (codigo, *registro) for codigo, registro in (registros or REGISTROS).items()}
+
+    for line in linhas:
+        registro = tabela.get(line[1:5])
+        if registro is None:
+            continue
+        codigo, tratador, pai, documento, emite = registro
+        if pai and not estado.get(pai):
+            continue
+
+        resultado = tratador(line, estado)
+        estado[codigo] = resultado
+        for descendente in DESCENDENTES[codigo]:
+            estado.pop(descendente, None)
+        if not resultado:
+            continue
+
+        if documento:
+            estado['documento'] = saida.adicionar_documento(resultado)
+            registrar_pendencia(estado, 'Participante', resultado.campos.get('Código Participante'), estado['documento'], codigo)
+        if emite:
+            indice_item = saida.adicionar_item(estado['documento'], resultado)
+            registrar_pendencia(estado, 'Item', saida.itens['Código Item'][indice_item], indice_item, codigo)
+
+def extrair_contexto(linhas, registros=None):
+    # Cabeçalho e índices de participantes/itens (somente leitura nos trechos)
+    estado = novo_estado()
+    processar_linhas(linhas, estado, registros)
+    return {chave: estado[chave] for chave in ('0000', 'participantes', 'produtos')}
+
+# Processamento paralelo de um único arquivo: após o bloco 0, os blocos A, C, D e F
+# (delimitados por X001/X990) são divididos em trechos que começam sempre em um
+# registro de documento, processados em paralelo e concatenados na ordem original.
+BLOCOS_DOCUMENTOS = ['A', 'C', 'D', 'F']
+
+def processar_bytes_paralelo(conteudo, executor, trechos_por_bloco=4, caminho=None, perfil=None, familias=None, progresso=None):
+    # 'conteudo' pode ser bytes ou um mmap. Com 'caminho', cada processo mapeia o
+    # próprio arquivo e lê só o seu trecho, sem copiar os dados entre processos.
+    # Com 'familias', só os blocos com famílias selecionadas são divididos em trechos.
+    trechos = dividir_trechos(conteudo, trechos_por_bloco, blocos_selecionados(familias)) or [(0, len(conteudo))]
+
+    linhas = ler_selecao(conteudo, familias, trechos[0][0])
+    registros = selecionar_registros(familias)
+    if perfil:
+        with perfil.rastrear_memoria(), perfil.fase('passagem'):
+            contexto = extrair_contexto(perfil.iterar('leitura', linhas), perfil.instrumentar(registros))
+    else:
+        contexto = extrair_contexto(linhas, registros)
+
+    # Cada trecho recebe um perfil vazio; as medições são somadas aqui ao final
+    perfil_trecho = Perfil(perfil.memoria) if perfil else None
+    progressos = [progresso.parte(numero) if progresso else None for numero in range(len(trechos))]
+    for (inicio, fim), progresso_trecho in zip(trechos, progressos):
+        if progresso_trecho:
+            progresso_trecho.prever(fim - inicio)
+    if caminho:
+        futuros = [
+            executor.submit(processar_trecho_arquivo, caminho, inicio, fim, contexto, perfil_trecho, familias, progresso_trecho)
+            for (inicio, fim), progresso_trecho in zip(trechos, progressos)
+        ]
+    else:
+        futuros = [
+            executor.submit(processar_trecho, conteudo[inicio:fim], contexto, perfil_trecho, familias, progresso_trecho)
+            for (inicio, fim), progresso_trecho in zip(trechos, progressos)
+        ]
+    partes = [futuro.result() for futuro in futuros]
+    resumo = combinar_resumos([parte.attrs.pop('resumo') for parte in partes])
+    inconsistencias = combinar_inconsistencias([parte.attrs.pop('inconsistencias') for parte in partes])
+    if not perfil:
+        df = concatenar_resultados(partes)
+        df.attrs.update(resumo=resumo, inconsistencias=inconsistencias)
+        return df
+
+    for parte in partes:
+        perfil.combinar(parte.attrs.pop('perfil'))
+    with perfil.fase('montagem DataFrame'):
+        df = concatenar_resultados(partes)
+    df.attrs.update(resumo=resumo, inconsistencias=inconsistencias, perfil=perfil)
+    return df
+
+def processar_caminho_paralelo(caminho, executor, trechos_por_bloco=4, perfil=None, familias=None, progresso=None):
+    if arquivo_vazio(caminho):
+        return processar_bytes(b'', perfil, familias, progresso)
+    mapa = mapear_arquivo(caminho)
+    try:
+        return processar_bytes_paralelo(mapa, executor, trechos_por_bloco, caminho, perfil, familias, progresso)
+    finally:
+        mapa.close()
+
+def processar_trecho(conteudo, contexto, perfil=None, familias=None, progresso=None):
+    return processar_arquivo(ler_linhas(io.BytesIO(conteudo)), contexto, perfil, familias, progresso)
+
+def processar_trecho_arquivo(caminho, inicio, fim, contexto, perfil=None, familias=None, progresso=None):
+    mapa = mapear_arquivo(caminho)
+    try:
+        return processar_arquivo(ler_linhas_mapa(mapa, inicio, fim), contexto, perfil, familias, progresso)
+    finally:
+        mapa.close()
+
+# Reprocessamento incremental (ex.: retificadora de um arquivo já processado): cada
+# documento, com seus filhos, tem um hash e a quantidade de linhas que gerou (ver
+# indice_efd.assinar_documentos); os documentos iguais aos da versão anterior têm as
+# linhas copiadas do resultado anterior e só os novos ou alterados são processados.
+
+def processar_versao(origem, anterior=None, diretorio_indice=None, progresso=None):
+    # Ponto de entrada dos processos de trabalho: 'origem' é um caminho ou os bytes do
+    # arquivo e 'anterior', os caminhos (resultado .parquet, assinatura .npz) de outra
+    # versão do mesmo CNPJ/período; se não puderem ser lidos, o arquivo é processado inteiro
+    if anterior:
+        assinatura = ler_arrays(anterior[1])
+        try:
+            anterior = (pd.read_parquet(anterior[0]), assinatura) if assinatura else None
+        except OSError:
+            anterior = None
+    if not isinstance(origem, str) or arquivo_vazio(origem):
+        return processar_incremental(origem if not isinstance(origem, str) else b'', anterior, progresso=progresso)
+    mapa = mapear_arquivo(origem)
+    try:
+        return processar_incremental(mapa, anterior, obter_indice(origem, mapa, CODIGOS_INDICE, diretorio_indice), progresso)
+    finally:
+        mapa.close()
+
+def processar_incremental(conteudo, anterior=None, indice=None, progresso=None):
+    # 'conteudo' em bytes ou mmap; 'anterior' = (DataFrame, assinatura) de outra versão.
+    # Com os mesmos cadastros, os documentos são casados pelo hash e o resultado é montado
+    # na ordem do arquivo novo. Voltam em df.attrs: 'resumo', 'inconsistencias' (só do que
+    # foi processado), 'assinatura' (com as linhas por documento, para a próxima versão) e
+    # 'diferenca' (None sem versão anterior).
+    indice = construir_indice(conteudo, CODIGOS_INDICE) if indice is None else indice
+    assinatura = assinar_documentos(indice, conteudo, list(FAMILIAS))
+    if assinatura is None:
+        if progresso:
+            progresso.prever(len(conteudo))
+        df = processar_arquivo(ler_intervalos(conteudo, [(0, len(conteudo))]), progresso=progresso)
+        df.attrs.update(assinatura=None, diferenca=None)
+        return df
+    if anterior and (anterior[1] is None or anterior[1]['cadastros'][0] != assinatura['cadastros'][0]):
+        anterior = None
+
+    # Documento anterior reaproveitado por cada documento (-1: processar)
+    origem = np.full(len(assinatura['hashes']), -1, dtype=np.int64)
+    if anterior:
+        disponiveis = {}
+        for posicao, valor in enumerate(anterior[1]['hashes'].tolist()):
+            disponiveis.setdefault(valor, deque()).append(posicao)
+        for posicao, valor in enumerate(assinatura['hashes'].tolist()):
+            fila = disponiveis.get(valor)
+            if fila:
+                origem[posicao] = fila.popleft()
+    processados = np.flatnonzero(origem < 0)
+
+    # Bloco 0 e documentos a processar, anotando as linhas de saída ao fim de cada um: ao ser
+    # pedida a linha seguinte, a última do documento já foi tratada (o progresso não lê adiante)
+    fim_cadastros = fim_bloco_0(indice, conteudo)
+    if progresso:
+        progresso.prever(fim_cadastros + int((assinatura['fins'][processados] - assinatura['inicios'][processados]).sum()))
+    estado = novo_estado()
+    saida = estado['saida']
+    linhas_geradas = []
+    leitor = conteudo if isinstance(conteudo, mmap.mmap) else io.BytesIO(conteudo)
+
+    def linhas():
+        yield from ler_linhas_mapa(leitor, 0, fim_cadastros)
+        for posicao in processados.tolist():
+            yield from ler_linhas_mapa(leitor, int(assinatura['inicios'][posicao]), int(assinatura['fins'][posicao]))
+            linhas_geradas.append(len(saida.documento_do_item))
+
+    if progresso:
+        processar_linhas(progresso.acompanhar(linhas(), lambda: len(saida.documento_do_item)), estado)
+    else:
+        processar_linhas(linhas(), estado)
+    pendentes = resolver_pendencias(estado)
+    avisar_pendencias(pendentes)
+    novo = saida.montar()
+
+    linhas_documento = np.zeros(len(origem), dtype=np.int64)
+    linhas_documento[processados] = np.diff(linhas_geradas, prepend=0)
+    if not anterior:
+        df = novo
+        df.attrs['resumo'] = saida.resumir(estado['participantes'])
+        diferenca = None
+    else:
+        df_anterior, assinatura_anterior = anterior
+        reaproveitados = origem >= 0
+        linhas_documento[reaproveitados] = assinatura_anterior['linhas'][origem[reaproveitados]]
+        # Posição da primeira linha de cada documento em [resultado anterior, processados]
+        inicio_anterior = np.cumsum(assinatura_anterior['linhas']) - assinatura_anterior['linhas']
+        inicio_processado = len(df_anterior) + np.cumsum(linhas_documento[processados]) - linhas_documento[processados]
+        inicios = np.empty(len(origem), dtype=np.int64)
+        inicios[reaproveitados] = inicio_anterior[origem[reaproveitados]]
+        inicios[processados] = inicio_processado
+        deslocamento = np.cumsum(linhas_documento) - linhas_documento
+        posicoes = np.repeat(inicios - deslocamento, linhas_documento) + np.arange(linhas_documento.sum())
+
+        df = concatenar_resultados([df_anterior, novo] if len(novo) else [df_anterior])
+        df = df.take(posicoes).reset_index(drop=True)
+        df.attrs = {'resumo': resumir_resultado(df)}
+        diferenca = comparar_versoes(assinatura, assinatura_anterior, origem)
+
+    assinatura['linhas'] = linhas_documento
+    df.attrs.update(inconsistencias=contar_inconsistencias(estado, pendentes), assinatura=assinatura, diferenca=diferenca)
+    return df
+
+def comparar_versoes(assinatura, assinatura_anterior, origem):
+    # Documentos por família: iguais, novos ou alterados (processados) e removidos ou alterados
+    removidos = np.ones(len(assinatura_anterior['hashes']), dtype=bool)
+    removidos[origem[origem >= 0]] = False
+    diferenca = {'Registros': [], 'Iguais': [], 'Novos/alterados': [], 'Removidos/alterados': []}
+    for familia, descricao in FAMILIAS.items():
+        da_familia = assinatura['registros'] == familia
+        contagens = [
+            int((da_familia & (origem >= 0)).sum()),
+            int((da_familia & (origem < 0)).sum()),
+            int((removidos & (assinatura_anterior['registros'] == familia)).sum()),
+        ]
+        if any(contagens):
+            diferenca['Registros'].append(descricao)
+            for coluna, contagem in zip(['Iguais', 'Novos/alterados', 'Removidos/alterados'], contagens):
+                diferenca[coluna].append(contagem)
+    return diferenca
+
+def blocos_selecionados(familias=None):
+    return [bloco for bloco in BLOCOS_DOCUMENTOS if familias is None or any(familia[0] == bloco for familia in familias)]
+
+def blocos_ignorados(conteudo, familias=None):
+    # Intervalos [início, fim) dos blocos de documentos fechados (com |X990|) sem família selecionada
+    if familias is None:
+        return []
+    intervalos = []
+    for bloco in BLOCOS_DOCUMENTOS:
+        if bloco not in blocos_selecionados(familias):
+            limites = localizar_bloco(conteudo, bloco)
+            if limites and limites[1]:
+                intervalos.append(limites)
+    return sorted(intervalos)
+
+def localizar_bloco(conteudo, bloco):
+    # (início da linha |X001|, fim da linha |X990| ou None se o bloco não for fechado); None sem o bloco
+    inicio = localizar_linha(conteudo, f'|{bloco}001|'.encode())
+    if inicio < 0:
+        return None
+    fim = localizar_linha(conteudo, f'|{bloco}990|'.encode(), inicio)
+    return inicio, (conteudo.find(b'\n', fim) + 1 or len(conteudo)) if fim >= 0 else None
+
+def dividir_trechos(conteudo, trechos_por_bloco, blocos=BLOCOS_DOCUMENTOS):
+    trechos = []
+    for bloco in blocos:
+        limites = localizar_bloco(conteudo, bloco)
+        if not limites:
+            continue
+        inicio, fim = limites
+        fim = fim or fim_bloco_aberto(conteudo, inicio)
+
+        tamanho = max((fim - inicio) // trechos_por_bloco, 1)
+        while inicio < fim:
+            corte = proximo_documento(conteudo, min(inicio + tamanho, fim), fim)
+            trechos.append((inicio, corte))
+            inicio = corte
+    return trechos
+
+def fim_bloco_aberto(conteudo, inicio):
+    # Bloco sem |X990|: vai até o início do bloco de documentos seguinte, para que os
+    # trechos dos blocos não se sobreponham (ou até o fim do arquivo, se for o último)
+    seguintes = [localizar_bloco(conteudo, bloco) for bloco in BLOCOS_DOCUMENTOS]
+    return min((limites[0] for limites in seguintes if limites and limites[0] > inicio), default=len(conteudo))
+
+def localizar_linha(conteudo, marcador, inicio=0):
+    # Posição da linha que começa com 'marcador' a partir de 'inicio' (ou -1)
+    if conteudo[inicio:inicio + len(marcador)] == marcador:
+        return inicio
+    posicao = conteudo.find(b'\n' + marcador, inicio)
+    return posicao + 1 if posicao >= 0 else -1
+
+def proximo_documento(conteudo, posicao, fim):
+    # Início da primeira linha de registro de documento (C100, D500, ...) a partir de 'posicao'
+    while posicao < fim:
+        posicao = conteudo.find(b'\n|', posicao, fim)
+        if posicao < 0:
+            return fim
+        posicao += 1
+        registro = REGISTROS.get(conteudo[posicao + 1:posicao + 5].decode(ENCODING))
+        if registro and registro[2]:
+            return posicao
+    return fim
+
+# Registros tratados: código -> (tratador, registro pai, abre documento, emite linha de saída).
+# Registros ausentes da tabela são ignorados com uma única consulta ao dicionário.
+REGISTROS = {}
+DESCENDENTES = {}
+
+def selecionar_registros(familias=None):
+    # Tabela só com o bloco 0 e as famílias (registro de documento e descendentes) escolhidas
+    if familias is None:
+        return REGISTROS
+    desconhecidas = set(familias) - set(FAMILIAS)
+    if desconhecidas:
+        raise ValueError(f"Registros desconhecidos: {', '.join(sorted(desconhecidas))}")
+    return {
+        codigo: registro for codigo, registro in REGISTROS.items()
+        if familia_registro(codigo) in (None, *familias)
+    }
+
+def familia_registro(codigo):
+    # Registro de documento que inicia a família do registro (None para o bloco 0)
+    while REGISTROS[codigo][1]:
+        codigo = REGISTROS[codigo][1]
+    return codigo if REGISTROS[codigo][2] else None
+
+def registrar(codigo, pai=None, documento=False, emite=False):
+    # Inclui o tratador na tabela; ao ler um novo registro, o estado de seus
+    # descendentes (ex.: C170 ao ler um C100) é descartado.
+    def decorador(tratador):
+        REGISTROS[codigo] = (tratador, pai, documento, emite)
+        DESCENDENTES[codigo] = []
+        ancestral = pai
+        while ancestral:
+            DESCENDENTES[ancestral].append(codigo)
+            ancestral = REGISTROS[ancestral][1]
+        return tratador
+    return decorador
+
+# Esquema fixo da tabela de resultados
+COLUNAS_DOCUMENTO = [
+    'CNPJ', 'Período', 'ANO', 'Registros', 'Tipo Operação', 'Situação',
+    'Código Participante', 'CNPJ Participante', 'CPF Participante', 'Nome Participante',
+    'UF Origem/Destino', 'Número Documento', 'Série', 'Chave NF-e', 'Data Documento',
+    'Data Entrada/Saída', 'Vlr Documento', 'Vlr Desconto NF', 'Vlr Mercadoria/Operação',
+    'Vlr Frete', 'Vlr ISSQN',
+]
+
+COLUNAS_ITEM = [
+    'Número Item', 'Código Item', 'Descrição Complementar', 'Descrição Item', 'NCM',
+    'Código Serviço', 'Código Barra', 'Tipo Item', 'Vlr Item', 'Qtde', 'Unidade Medida',
+    'Vlr Desconto Item', 'Natureza Crédito', 'CFOP', 'CFOP Faturamento', 'CST ICMS',
+    'Vlr Base Cálculo ICMS', 'Alíquota ICMS', 'Vlr ICMS', 'Vlr Base Cálculo ICMS ST',
+    'Alíquota ICMS ST', 'Vlr ICMS ST', 'CST IPI', 'Vlr Base Cálculo IPI', 'Alíquota IPI',
+    'Vlr IPI', 'pis/cofins', 'CST PIS', 'Vlr Base Cálculo PIS', 'Qtde Base Cálculo PIS',
+    'Alíquota PIS', 'Qtde Alíquota PIS', 'Vlr PIS', 'CST Cofins', 'Vlr Base Cálculo Cofins',
+    'Qtde Base Cálculo Cofins', 'Alíquota Cofins', 'Qtde Alíquota Cofins', 'Vlr Cofins',
+    'Conta Contábil', 'Débito/Crédito',
+]
+
+COLUNAS = COLUNAS_DOCUMENTO + COLUNAS_ITEM
+
+# Colunas numéricas, lidas no formato decimal brasileiro ("1234,56") e convertidas para float64
+COLUNAS_ALIQUOTA = [
+    'Alíquota ICMS', 'Alíquota ICMS ST', 'Alíquota IPI', 'Alíquota PIS', 'Qtde Alíquota PIS',
+    'Alíquota Cofins', 'Qtde Alíquota Cofins',
+]
+
+COLUNAS_VALOR = [
+    'Vlr Documento', 'Vlr Desconto NF', 'Vlr Mercadoria/Operação', 'Vlr Frete', 'Vlr ISSQN',
+    'Vlr Item', 'Qtde', 'Vlr Desconto Item', 'Vlr Base Cálculo ICMS', 'Vlr ICMS',
+    'Vlr Base Cálculo ICMS ST', 'Vlr ICMS ST', 'Vlr Base Cálculo IPI', 'Vlr IPI', 'pis/cofins',
+    'Vlr Base Cálculo PIS', 'Qtde Base Cálculo PIS', 'Vlr PIS', 'Vlr Base Cálculo Cofins',
+    'Qtde Base Cálculo Cofins', 'Vlr Cofins',
+] + COLUNAS_ALIQUOTA
+
+# Datas no formato DDMMAAAA, convertidas em lote para datetime64
+COLUNAS_DATA = ['Período', 'Data Documento', 'Data Entrada/Saída']
+
+# Textos com poucos valores distintos, emitidos como category (códigos inteiros + dicionário)
+COLUNAS_CATEGORIA = [
+    'CNPJ', 'ANO', 'Registros', 'Tipo Operação', 'Situação', 'Código Participante',
+    'CNPJ Participante', 'CPF Participante', 'Nome Participante', 'UF Origem/Destino', 'Série',
+    'Número Item', 'Código Item', 'Descrição Complementar', 'Descrição Item', 'NCM',
+    'Código Serviço', 'Código Barra', 'Tipo Item', 'Unidade Medida', 'Natureza Crédito', 'CFOP',
+    'CFOP Faturamento', 'CST ICMS', 'CST IPI', 'CST PIS', 'CST Cofins', 'Conta Contábil',
+    'Débito/Crédito',
+]
+
+# Totais acumulados durante a leitura, por combinação das dimensões de resumo
+DIMENSOES_RESUMO = ['Registros', 'CST PIS', 'Natureza Crédito', 'CFOP', 'Código Participante']
+VALORES_RESUMO = ['Vlr Item', 'Vlr Base Cálculo PIS', 'Vlr PIS', 'Vlr Base Cálculo Cofins', 'Vlr Cofins']
+
+# Estado da leitura. Cada registro guarda só os próprios campos e referencia o
+# cabeçalho, o participante, o produto ou o registro pai em vez de copiá-los;
+# os campos herdados são resolvidos uma única vez, ao gravar na saída.
+COLUNAS_CABECALHO = ['CNPJ', 'Período', 'ANO']
+COLUNAS_PARTICIPANTE = ['CNPJ Participante', 'CPF Participante', 'Nome Participante', 'UF Origem/Destino']
+COLUNAS_PRODUTO = ['Descrição Item', 'NCM', 'Código Serviço', 'Código Barra', 'Tipo Item']
+
+class Cabecalho:
+    __slots__ = ('cnpj', 'periodo', 'ano')
+
+    def __init__(self, cnpj='', periodo='', ano=''):
+        self.cnpj = cnpj
+        self.periodo = periodo
+        self.ano = ano
+
+class Documento:
+    # 'campos' pode trazer também campos de item (ex.: ICMS do D100, lido pelo D101);
+    # o F100 é documento e item ao mesmo tempo, sem pai nem produto
+    __slots__ = ('cabecalho', 'participante', 'campos')
+    pai = None
+    produto = None
+
+    def __init__(self, cabecalho, participante, campos):
+        self.cabecalho = cabecalho
+        self.participante = participante
+        self.campos = campos
+
+class Item:
+    # 'pai' é o registro que completa este (ex.: C501 para o C505); 'produto', o 0200 do item
+    __slots__ = ('pai', 'produto', 'campos')
+
+    def __init__(self, pai, produto, campos):
+        self.pai = pai
+        self.produto = produto
+        self.campos = campos
+
+class AcumuladorSaida:
+    # Resultado em buffers por coluna. Os campos do documento são gravados uma
+    # vez por documento; cada item guarda só o índice do seu documento, que é
+    # expandido ao montar o DataFrame.
+    def __init__(self):
+        self.documentos = {coluna: [] for coluna in COLUNAS_DOCUMENTO}
+        self.itens = {coluna: [] for coluna in COLUNAS_ITEM}
+        self.documento_do_item = array('q')
+        self.totais = {}
+
+        # Buffers agrupados pela origem do valor
+        self.colunas_cabecalho = [self.documentos[coluna] for coluna in COLUNAS_CABECALHO]
+        self.colunas_participante = [(coluna, self.documentos[coluna]) for coluna in COLUNAS_PARTICIPANTE]
+        self.colunas_documento = [
+            (coluna, valores) for coluna, valores in self.documentos.items()
+            if coluna not in COLUNAS_CABECALHO + COLUNAS_PARTICIPANTE
+        ]
+        self.colunas_produto = [(coluna, self.itens[coluna]) for coluna in COLUNAS_PRODUTO]
+        self.colunas_item = [(coluna, valores) for coluna, valores in self.itens.items() if coluna not in COLUNAS_PRODUTO]
+        self.colunas_resumo = [self.itens[coluna] for coluna in VALORES_RESUMO]
+
+    def adicionar_documento(self, documento):
+        cabecalho = documento.cabecalho
+        cnpj, periodo, ano = self.colunas_cabecalho
+        cnpj.append(cabecalho.cnpj)
+        periodo.append(cabecalho.periodo)
+        ano.append(cabecalho.ano)
+        participante = documento.participante
+        for coluna, valores in self.colunas_participante:
+            valores.append(participante[coluna])
+        campos = documento.campos
+        for coluna, valores in self.colunas_documento:
+            valores.append(campos.get(coluna, ''))
+        return len(cnpj) - 1
+
+    def adicionar_item(self, indice_documento, item):
+        self.documento_do_item.append(indice_documento)
+        campos = item.campos
+        herdados = item.pai.campos if item.pai else {}
+        for coluna, valores in self.colunas_item:
+            valor = campos.get(coluna)
+            valores.append(herdados.get(coluna, '') if valor is None else valor)
+        produto = item.produto or PRODUTO_NAO_ENCONTRADO[0]
+        for coluna, valores in self.colunas_produto:
+            valores.append(produto[coluna])
+
+        itens = self.itens
+        chave = (
+            self.documentos['Registros'][indice_documento], itens['CST PIS'][-1],
+            itens['Natureza Crédito'][-1], itens['CFOP'][-1],
+            self.documentos['Código Participante'][indice_documento],
+        )
+        totais = self.totais.get(chave)
+        if totais is None:
+            totais = self.totais[chave] = [0] + [0.0] * len(VALORES_RESUMO)
+        totais[0] += 1
+        for posicao, valores in enumerate(self.colunas_resumo, 1):
+            totais[posicao] += valor_decimal(valores[-1])
+        return len(self.documento_do_item) - 1
+
+    def atualizar_documento(self, indice, campos):
+        for coluna, valor in campos.items():
+            self.documentos[coluna][indice] = valor
+
+    def atualizar_item(self, indice, campos):
+        for coluna, valor in campos.items():
+            self.itens[coluna][indice] = valor
+
+    def montar(self):
+        # As colunas de valor do documento são convertidas antes de expandidas para os itens
+        indices = np.frombuffer(self.documento_do_item, dtype=np.int64)
+        colunas = {}
+        for coluna, valores in self.documentos.items():
+            if coluna in COLUNAS_VALOR:
+                valores = converter_decimal(valores)
+            elif coluna in COLUNAS_DATA:
+                valores = converter_data(valores)
+            elif coluna in COLUNAS_CATEGORIA:
+                valores = pd.Categorical(valores)
+            else:
+                valores = np.array(valores, dtype=object)
+            colunas[coluna] = valores[indices]
+        for coluna, valores in self.itens.items():
+            if coluna in COLUNAS_VALOR:
+                colunas[coluna] = converter_decimal(valores)
+            elif coluna in COLUNAS_CATEGORIA:
+                colunas[coluna] = pd.Categorical(valores)
+            else:
+                colunas[coluna] = np.array(valores, dtype=object)
+        colunas['pis/cofins'] = colunas['Vlr PIS'] + colunas['Vlr Cofins']
+        return pd.DataFrame(colunas, columns=COLUNAS)
+
+    def resumir(self, participantes):
+        # Totais por colunas (listas), prontos para DataFrame e serializáveis em JSON
+        resumo = {coluna: [] for coluna in DIMENSOES_RESUMO + ['Nome Participante', 'Linhas'] + VALORES_RESUMO}
+        for chave, totais in self.totais.items():
+            for coluna, valor in zip(DIMENSOES_RESUMO, chave):
+                resumo[coluna].append(valor)
+            resumo['Nome Participante'].append(buscar_participante(participantes, chave[-1])['Nome Participante'])
+            for coluna, valor in zip(['Linhas'] + VALORES_RESUMO, totais):
+                resumo[coluna].append(valor)
+        return resumo
+
+def concatenar_resultados(partes):
+    # pd.concat transforma em object as colunas category com dicionários diferentes;
+    # elas são refeitas com a união dos dicionários. Partes vazias (trechos ou arquivos
+    # sem linhas) são descartadas, mantendo uma para preservar o esquema.
+    partes = [parte for parte in partes if len(parte)] or partes[:1]
+    df = pd.concat(partes, ignore_index=True)
+    for coluna in partes[0].select_dtypes('category').columns:
+        if len(partes) > 1 and all(isinstance(parte[coluna].dtype, pd.CategoricalDtype) for parte in partes):
+            df[coluna] = union_categoricals([parte[coluna] for parte in partes])
+    return df
+
+def combinar_resumos(resumos):
+    # Soma resumos de vários arquivos ou trechos
+    if len(resumos) == 1:
+        return resumos[0]
+    dimensoes = DIMENSOES_RESUMO + ['Nome Participante']
+    combinado = pd.concat([pd.DataFrame(resumo) for resumo in resumos], ignore_index=True)
+    combinado = combinado.groupby(dimensoes, sort=False, as_index=False, dropna=False).sum()
+    return combinado.to_dict('list')
+
+def resumir_resultado(df):
+    # Os mesmos totais de AcumuladorSaida.resumir, calculados a partir de um resultado montado
+    grupos = df.groupby(DIMENSOES_RESUMO + ['Nome Participante'], sort=False, observed=True, dropna=False)
+    totais = grupos[VALORES_RESUMO].sum()
+    totais.insert(0, 'Linhas', grupos.size())
+    resumo = totais.reset_index()
+    for coluna in DIMENSOES_RESUMO + ['Nome Participante']:
+        resumo[coluna] = resumo[coluna].astype(object)
+    return resumo.to_dict('list')
+
+def valor_decimal(texto):
+    # "1234,56" -> 1234.56; campos vazios ou inválidos não somam
+    try:
+        return float(texto.replace(',', '.'))
+    except ValueError:
+        return 0.0
+
+def converter_decimal(valores):
+    # "1234,56" -> 1234.56 para a coluna inteira; campos vazios ou inválidos viram NaN
+    serie = pd.Series(valores, dtype=object).str.replace(',', '.', regex=False)
+    return pd.to_numeric(serie, errors='coerce').to_numpy(dtype=np.float64)
+
+def converter_data(valores):
+    # "31012024" -> 2024-01-31 para a coluna inteira; campos vazios ou inválidos viram NaT
+    return pd.to_datetime(pd.Series(valores, dtype=object), format='%d%m%Y', errors='coerce').to_numpy()
+
+# Funções auxiliares
+def define_enumeradores(tipo, valor):
+    if tipo == "Tipo Operação":       
+        data = {
+            0: "0 - Entrada",
+            1: "1 - Saída",
+        }
+        return data.get(valor, "Opção inválida")
+    elif tipo == "Situação":
+        data = {
+            0: "00 - Documento regular",
+            1: "02 - Documento cancelado",
+        }
+        return data.get(valor, "Opção inválida")
+    elif tipo == "UF":
+        data = {
+            12: "AC",  # Acre
+            27: "AL",  # Alagoas
+            13: "AM",  # Amazonas
+            16: "AP",  # Amapá
+            29: "BA",  # Bahia
+            23: "CE",  # Ceará
+            53: "DF",  # Distrito Federal
+            32: "ES",  # Espírito Santo
+            52: "GO",  # Goiás
+            21: "MA",  # Maranhão
+            31: "MG",  # Minas Gerais
+            50: "MS",  # Mato Grosso do Sul
+            51: "MT",  # Mato Grosso
+            15: "PA",  # Pará
+            25: "PB",  # Paraíba
+            26: "PE",  # Pernambuco
+            22: "PI",  # Piauí
+            41: "PR",  # Paraná
+            33: "RJ",  # Rio de Janeiro
+            24: "RN",  # Rio Grande do Norte
+            43: "RS",  # Rio Grande do Sul
+            11: "RO",  # Rondônia
+            14: "RR",  # Roraima
+            42: "SC",  # Santa Catarina
+            35: "SP",  # São Paulo
+            28: "SE",  # Sergipe
+            17: "TO",  # Tocantins
+        }
+        return data.get(valor, "Opção inválida")
+
+def dados_participante(participante):
+    # Campos de saída do participante, calculados uma única vez por registro 0150;
+    # os textos repetidos entre participantes são internados (um único objeto por valor)
+    cod_uf = participante['Código Municipio'][:2]
+    uf = define_enumeradores('UF', int(cod_uf)) if cod_uf.isdigit() else ''
+    return {
+        'CNPJ Participante': participante['CNPJ'],
+        'CPF Participante': participante['CPF'],
+        'Nome Participante': sys.intern(participante['Nome']),
+        'UF Origem/Destino': sys.intern(f"{uf}/{uf}") if uf else '',
+    }
+
+def dados_produto_servico(produto):
+    # (campos de saída do item, unidade de medida) de um registro 0200
+    return ({
+        'Descrição Item': sys.intern(produto['Descrição']),
+        'NCM': sys.intern(produto['Código NCM']),
+        'Código Serviço': produto['Código Serviço'],
+        'Código Barra': produto['Código Barra'],
+        'Tipo Item': sys.intern(produto['Tipo']),
+    }, sys.intern(produto['Unidade Medida']))
+
+PARTICIPANTE_NAO_ENCONTRADO = {
+    'CNPJ Participante': '',
+    'CPF Participante': '',
+    'Nome Participante': '',
+    'UF Origem/Destino': '',
+}
+
+PRODUTO_NAO_ENCONTRADO = ({
+    'Descrição Item': '',
+    'NCM': '',
+    'Código Serviço': '',
+    'Código Barra': '',
+    'Tipo Item': '',
+}, '')
+
+def buscar_participante(indice_participantes, codigo):
+    return indice_participantes.get(codigo, PARTICIPANTE_NAO_ENCONTRADO)
+
+def buscar_produto(indice_produtos, codigo):
+    return indice_produtos.get(codigo, PRODUTO_NAO_ENCONTRADO)
+
+def registrar_pendencia(estado, tipo, codigo, indice, registro):
+    # Guarda as linhas cujo participante/item ainda não está nos índices
+    indice_mestre = estado['participantes'] if tipo == 'Participante' else estado['produtos']
+    if codigo and codigo not in indice_mestre:
+        estado['pendentes'].append((tipo, codigo, indice, registro))
+
+def resolver_pendencias(estado):
+    # Completa as linhas pendentes com os índices atuais e devolve o que ainda falta
+    saida = estado['saida']
+    restantes = []
+    for tipo, codigo, indice, registro in estado['pendentes']:
+        if tipo == 'Participante' and codigo in estado['participantes']:
+            saida.atualizar_documento(indice, estado['participantes'][codigo])
+        elif tipo == 'Item' and codigo in estado['produtos']:
+            produto, unidade_medida = estado['produtos'][codigo]
+            saida.atualizar_item(indice, produto)
+            if registro == 'A170':
+                saida.atualizar_item(indice, {'Unidade Medida': unidade_medida})
+        else:
+            restantes.append((tipo, codigo, indice, registro))
+    return restantes
+
+@registrar('0000')
+def processar_cabecalho(line, estado):
+    arq = line.decode(ENCODING).split("|")
+    return Cabecalho(sys.intern(arq[9].strip()), sys.intern(arq[6]), sys.intern(arq[6][4:8]))
+
+# Leiautes dos registros: coluna -> índice do campo na linha, (índice, transformação)
+# ou texto fixo. Cada leiaute é compilado uma vez em um itemgetter; linhas com menos
+# campos que o leiaute são completadas com '' em vez de tratadas por exceção.
+class Leiaute:
+    def __init__(self, colunas):
+        self.fixos = {coluna: valor for coluna, valor in colunas.items() if isinstance(valor, str)}
+        variaveis = [
+            (coluna, valor if isinstance(valor, tuple) else (valor, None))
+            for coluna, valor in colunas.items() if not isinstance(valor, str)
+        ]
+        self.colunas = [coluna for coluna, _ in variaveis]
+        indices = [indice for _, (indice, _) in variaveis]
+        # Com um único índice o itemgetter devolveria o valor solto, não uma tupla
+        self.selecionar = itemgetter(*indices) if len(indices) > 1 else lambda campos: (campos[indices[0]],)
+        self.transformacoes = [(coluna, transformar) for coluna, (_, transformar) in variaveis if transformar]
+        self.tamanho = max(indices) + 1
+
+    def dividir(self, line):
+        # Decodifica a linha (bytes) de uma vez, mais barato que campo a campo, e só
+        # separa até o último campo usado; o restante fica junto no último elemento
+        return line.decode(ENCODING).split('|', self.tamanho)
+
+    def completar(self, campos):
+        if len(campos) < self.tamanho:
+            campos.extend([''] * (self.tamanho - len(campos)))
+        return campos
+
+    def ler(self, line, estado=None):
+        # Com 'estado', linhas com menos campos que o leiaute são contadas como inválidas
+        # (e mantidas, com os campos ausentes vazios)
+        campos = self.dividir(line)
+        if estado is not None and len(campos) < self.tamanho:
+            print(f"Linha {campos[1]} incompleta: {line.decode(ENCODING)}")
+            estado['invalidas'] += 1
+        return self.extrair(campos)
+
+    def extrair(self, campos):
+        valores = self.fixos.copy()
+        valores.update(zip(self.colunas, self.selecionar(self.completar(campos))))
+        for coluna, transformar in self.transformacoes:
+            valores[coluna] = transformar(valores[coluna])
+        return valores
+
+def sem_ponto_e_virgula(valor):
+    return valor.replace(';', '')
+
+def enumerador(tipo):
+    # Converte o código do campo no rótulo de define_enumeradores, guardando os códigos já vistos
+    rotulos = {}
+    def converter(valor):
+        rotulo = rotulos.get(valor)
+        if rotulo is None:
+            rotulo = rotulos[valor] = define_enumeradores(tipo, int(valor)) if valor.isdigit() else "Opção inválida"
+        return rotulo
+    return converter
+
+def ler_documento(line, estado, codigo, leiaute):
+    # Documentos sem todos os campos do leiaute são descartados (e seus filhos ignorados)
+    campos = leiaute.dividir(line)
+    if len(campos) < leiaute.tamanho:
+        print(f"Linha {codigo} inválida: {line.decode(ENCODING)}")
+        estado['invalidas'] += 1
+        return None
+    documento = leiaute.extrair(campos)
+    participante = (
+        buscar_participante(estado['participantes'], documento['Código Participante'])
+        if 'Código Participante' in documento else PARTICIPANTE_NAO_ENCONTRADO
+    )
+    return Documento(estado['0000'], participante, documento)
+
+TIPO_OPERACAO = (2, enumerador('Tipo Operação'))
+DESCRICAO_COMPLEMENTAR = (4, sem_ponto_e_virgula)
+
+LEIAUTE_0150 = Leiaute({
+    'Código': 2,
+    'Nome': (3, sem_ponto_e_virgula),
+    'CNPJ': 5,
+    'CPF': 6,
+    'Código Municipio': 8,
+})
+
+LEIAUTE_0200 = Leiaute({
+    'Código': 2,
+    'Descrição': (3, sem_ponto_e_virgula),
+    'Código Barra': 4,
+    'Tipo': 7,
+    'Código NCM': 8,
+    'Código Serviço': 11,
+    'Aliquota ICMS': 12,
+    'Unidade Medida': 6,
+})
+
+def processar_participante(line):
+    return LEIAUTE_0150.ler(line)
+
+def processar_produtos_servicos(line):
+    campos = LEIAUTE_0200.dividir(line)
+    if len(campos) < LEIAUTE_0200.tamanho:
+        return None
+    return LEIAUTE_0200.extrair(campos)
+
+@registrar('0150')
+def indexar_participante(line, estado):
+    participante = processar_participante(line)
+    estado['participantes'][participante['Código']] = dados_participante(participante)
+
+@registrar('0200')
+def indexar_produto_servico(line, estado):
+    produto = processar_produtos_servicos(line)
+    if produto:
+        estado['produtos'][produto['Código']] = dados_produto_servico(produto)
+
+@registrar('0990')
+def concluir_bloco_0(line, estado):
+    estado['pendentes'] = resolver_pendencias(estado)
+
+LEIAUTE_A100 = Leiaute({
+    'Registros': 'A100/A170 - Nota Fiscal de Serviço',
+    'Tipo Operação': TIPO_OPERACAO,
+    'Situação': (5, enumerador('Situação')),
+    'Código Participante': 4,
+    'Número Documento': 8,
+    'Série': 6,
+    'Chave NF-e': 9,
+    'Data Documento': 10,
+    'Data Entrada/Saída': 11,
+    'Vlr Documento': 12,
+    'Vlr Desconto NF': 14,
+    'Vlr ISSQN': 21,
+})
+
+@registrar('A100', documento=True)
+def processar_registro_a100(line, estado):
+    return ler_documento(line, estado, 'A100', LEIAUTE_A100)
+
+LEIAUTE_A170 = Leiaute({
+    'Número Item': 2,
+    'Código Item': 3,
+    'Descrição Complementar': DESCRICAO_COMPLEMENTAR,
+    'Vlr Item': 5,
+    'Vlr Desconto Item': 6,
+    'Natureza Crédito': 7,
+    'CST PIS': 9,
+    'Vlr Base Cálculo PIS': 10,
+    'Alíquota PIS': 11,
+    'Vlr PIS': 12,
+    'CST Cofins': 13,
+    'Vlr Base Cálculo Cofins': 14,
+    'Alíquota Cofins': 15,
+    'Vlr Cofins': 16,
+    'Conta Contábil': 17,
+})
+
+@registrar('A170', pai='A100', emite=True)
+def processar_registro_a170(line, estado):
+    campos = LEIAUTE_A170.dividir(line)
+    if len(campos) < LEIAUTE_A170.tamanho:
+        print(f"Linha A170 inválida: {line.decode(ENCODING)}")
+        estado['invalidas'] += 1
+        return None
+    item = LEIAUTE_A170.extrair(campos)
+    # O A170 não informa a unidade: vem do cadastro do item (0200)
+    produto, item['Unidade Medida'] = buscar_produto(estado['produtos'], item['Código Item'])
+    return Item(None, produto, item)
+
+LEIAUTE_C100 = Leiaute({
+    'Registros': 'C100/C170 - Documento - Nota Fiscal',
+    'Tipo Operação': TIPO_OPERACAO,
+    'Situação': (6, enumerador('Situação')),
+    'Código Participante': 4,
+    'Número Documento': 8,
+    'Série': 7,
+    'Chave NF-e': 9,
+    'Data Documento': 10,
+    'Data Entrada/Saída': 11,
+    'Vlr Documento': 12,
+    'Vlr Desconto NF': 14,
+    'Vlr Mercadoria/Operação': 16,
+    'Vlr Frete': 18,
+})
+
+@registrar('C100', documento=True)
+def processar_registro_c100(line, estado):
+    return ler_documento(line, estado, 'C100', LEIAUTE_C100)
+
+LEIAUTE_C170 = Leiaute({
+    'Número Item': 2,
+    'Código Item': 3,
+    'Descrição Complementar': DESCRICAO_COMPLEMENTAR,
+    'Vlr Item': 7,
+    'Qtde': 5,
+    'Unidade Medida': 6,
+    'Vlr Desconto Item': 8,
+    'Natureza Crédito': 12,
+    'CFOP': 11,
+    'CST ICMS': 10,
+    'Vlr Base Cálculo ICMS': 13,
+    'Alíquota ICMS': 14,
+    'Vlr ICMS': 15,
+    'Vlr Base Cálculo ICMS ST': 16,
+    'Alíquota ICMS ST': 17,
+    'Vlr ICMS ST': 18,
+    'CST IPI': 20,
+    'Vlr Base Cálculo IPI': 22,
+    'Alíquota IPI': 23,
+    'Vlr IPI': 24,
+    'CST PIS': 25,
+    'Vlr Base Cálculo PIS': 26,
+    'Qtde Base Cálculo PIS': 28,
+    'Alíquota PIS': 27,
+    'Qtde Alíquota PIS': 29,
+    'Vlr PIS': 30,
+    'CST Cofins': 31,
+    'Vlr Base Cálculo Cofins': 32,
+    'Qtde Base Cálculo Cofins': 34,
+    'Alíquota Cofins': 33,
+    'Qtde Alíquota Cofins': 35,
+    'Vlr Cofins': 36,
+    'Conta Contábil': 37,
+})
+
+@registrar('C170', pai='C100', emite=True)
+def processar_registro_c170(line, estado):
+    item = LEIAUTE_C170.ler(line, estado)
+    produto, _ = buscar_produto(estado['produtos'], item['Código Item'])
+    return Item(None, produto, item)
+
+LEIAUTE_C500 = Leiaute({
+    'Registros': 'C500/C505 - Nota Fiscal/Conta de Energia Elétrica/Água/Gás',
+    'Tipo Operação': define_enumeradores('Tipo Operação', 0),
+    'Situação': (4, enumerador('Situação')),
+    'Código Participante': 2,
+    'Número Documento': 7,
+    'Série': 5,
+    'Data Documento': 8,
+    'Data Entrada/Saída': 9,
+    'Vlr Documento': 10,
+})
+
+@registrar('C500', documento=True)
+def processar_registro_c500(line, estado):
+    return ler_documento(line, estado, 'C500', LEIAUTE_C500)
+
+# PIS do C501/D501, completado pelo Cofins do C505/D505
+LEIAUTE_PIS_ENERGIA_COMUNICACAO = Leiaute({
+    'Vlr Item': 3,
+    'Natureza Crédito': 4,
+    'CST PIS': 2,
+    'Vlr Base Cálculo PIS': 5,
+    'Alíquota PIS': 6,
+    'Vlr PIS': 7,
+})
+
+LEIAUTE_COFINS_ENERGIA_COMUNICACAO = Leiaute({
+    'CST Cofins': 2,
+    'Vlr Base Cálculo Cofins': 5,
+    'Alíquota Cofins': 6,
+    'Vlr Cofins': 7,
+    'Conta Contábil': 8,
+})
+
+@registrar('C501', pai='C500')
+def processar_registro_c501(line, estado):
+    return Item(None, None, LEIAUTE_PIS_ENERGIA_COMUNICACAO.ler(line, estado))
+
+@registrar('C505', pai='C501', emite=True)
+def processar_registro_c505(line, estado):
+    return Item(estado['C501'], None, LEIAUTE_COFINS_ENERGIA_COMUNICACAO.ler(line, estado))
+
+LEIAUTE_D100 = Leiaute({
+    'Registros': 'D100/D105 - Aquisição de Serviços de Transporte',
+    'Tipo Operação': TIPO_OPERACAO,
+    'Situação': (6, enumerador('Situação')),
+    'Código Participante': 4,
+    'Número Documento': 9,
+    'Série': 7,
+    'Chave NF-e': 10,
+    'Data Documento': 11,
+    'Data Entrada/Saída': 12,
+    'Vlr Documento': 15,
+    'Vlr Desconto NF': 16,
+    'Vlr Mercadoria/Operação': 18,
+    # ICMS do documento, repassado aos itens D101
+    'Vlr Base Cálculo ICMS': 19,
+    'Vlr ICMS': 20,
+})
+
+@registrar('D100', documento=True)
+def processar_registro_d100(line, estado):
+    return ler_documento(line, estado, 'D100', LEIAUTE_D100)
+
+LEIAUTE_D101 = Leiaute({
+    'Vlr Item': 3,
+    'Natureza Crédito': 5,
+    'CST PIS': 4,
+    'Vlr Base Cálculo PIS': 6,
+    'Alíquota PIS': 7,
+    'Vlr PIS': 8,
+})
+
+@registrar('D101', pai='D100')
+def processar_registro_d101(line, estado):
+    item = LEIAUTE_D101.ler(line, estado)
+    documento = estado['D100'].campos
+    item['Vlr Base Cálculo ICMS'] = documento['Vlr Base Cálculo ICMS']
+    item['Vlr ICMS'] = documento['Vlr ICMS']
+    return Item(None, None, item)
+
+LEIAUTE_D105 = Leiaute({
+    'CST Cofins': 4,
+    'Vlr Base Cálculo Cofins': 6,
+    'Alíquota Cofins': 7,
+    'Vlr Cofins': 8,
+    'Conta Contábil': 9,
+})
+
+@registrar('D105', pai='D101', emite=True)
+def processar_registro_d105(line, estado):
+    return Item(estado['D101'], None, LEIAUTE_D105.ler(line, estado))
+
+LEIAUTE_D200 = Leiaute({
+    'Registros': 'D200/D205 - Resumo Diário - Nota Fiscal de Serviço de Transporte',
+    'Tipo Operação': define_enumeradores('Tipo Operação', 1),
+    'Número Documento': 6,
+    'Série': 4,
+    'Data Documento': 9,
+    'Vlr Documento': 10,
+    'Vlr Desconto NF': 11,
+    # CFOP do resumo, repassado aos itens D201
+    'CFOP': 8,
+})
+
+@registrar('D200', documento=True)
+def processar_registro_d200(line, estado):
+    return ler_documento(line, estado, 'D200', LEIAUTE_D200)
+
+LEIAUTE_D201 = Leiaute({
+    'Vlr Item': 3,
+    'CFOP Faturamento': 'Faturamento',
+    'CST PIS': 2,
+    'Vlr Base Cálculo PIS': 4,
+    'Alíquota PIS': 5,
+    'Vlr PIS': 6,
+})
+
+@registrar('D201', pai='D200')
+def processar_registro_d201(line, estado):
+    item = LEIAUTE_D201.ler(line, estado)
+    item['CFOP'] = estado['D200'].campos['CFOP']
+    return Item(None, None, item)
+
+LEIAUTE_D205 = Leiaute({
+    'CST Cofins': 2,
+    'Vlr Base Cálculo Cofins': 4,
+    'Alíquota Cofins': 5,
+    'Vlr Cofins': 6,
+    'Conta Contábil': 7,
+})
+
+@registrar('D205', pai='D201', emite=True)
+def processar_registro_d205(line, estado):
+    return Item(estado['D201'], None, LEIAUTE_D205.ler(line, estado))
+
+LEIAUTE_D500 = Leiaute({
+    'Registros': 'D500/D505 - Nota Fiscal de Serviço de Comunicação',
+    'Tipo Operação': TIPO_OPERACAO,
+    'Situação': (6, enumerador('Situação')),
+    'Código Participante': 4,
+    'Número Documento': 9,
+    'Série': 7,
+    'Data Documento': 10,
+    'Data Entrada/Saída': 11,
+    'Vlr Documento': 12,
+    'Vlr Desconto NF': 13,
+    'Vlr Mercadoria/Operação': 14,
+})
+
+@registrar('D500', documento=True)
+def processar_registro_d500(line, estado):
+    return ler_documento(line, estado, 'D500', LEIAUTE_D500)
+
+@registrar('D501', pai='D500')
+def processar_registro_d501(line, estado):
+    return Item(None, None, LEIAUTE_PIS_ENERGIA_COMUNICACAO.ler(line, estado))
+
+@registrar('D505', pai='D501', emite=True)
+def processar_registro_d505(line, estado):
+    return Item(estado['D501'], None, LEIAUTE_COFINS_ENERGIA_COMUNICACAO.ler(line, estado))
+
+LEIAUTE_F100 = Leiaute({
+    'Registros': 'F100 - Demais Documentos e Operações',
+    'Tipo Operação': define_enumeradores('Tipo Operação', 1),
+    'Data Documento': 5,
+    'Vlr Documento': 6,
+    'Vlr Item': 6,
+    'Natureza Crédito': 15,
+    'CST PIS': 7,
+    'Vlr Base Cálculo PIS': 8,
+    'Alíquota PIS': 9,
+    'Vlr PIS': 10,
+    'CST Cofins': 11,
+    'Vlr Base Cálculo Cofins': 12,
+    'Alíquota Cofins': 13,
+    'Vlr Cofins': 14,
+    'Conta Contábil': 17,
+})
+
+@registrar('F100', documento=True, emite=True)
+def processar_registro_f100(line, estado):
+    return ler_documento(line, estado, 'F100', LEIAUTE_F100)
+
+# Famílias de registros que podem ser selecionadas: registro de documento -> descrição
+FAMILIAS = {
+    codigo: leiaute.fixos['Registros']
+    for codigo, leiaute in [
+        ('A100', LEIAUTE_A100), ('C100', LEIAUTE_C100), ('C500', LEIAUTE_C500), ('D100', LEIAUTE_D100),
+        ('D200', LEIAUTE_D200), ('D500', LEIAUTE_D500), ('F100', LEIAUTE_F100),
+    ]
+}
+
+# Registros com posição guardada no índice do arquivo (além dos delimitadores de bloco)
+CODIGOS_INDICE = [*FAMILIAS, '0150', '0200']
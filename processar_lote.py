@@ -0,0 +1,125 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from processador_efd import FAMILIAS, processar_caminho
+
+# Processamento em lote, sem Streamlit, para rodar em agendadores (cron):
+#   python processar_lote.py "arquivos/**/*.txt" --saida resultados --formato parquet --workers 8
+#   python processar_lote.py "arquivos/*.txt" --saida resultados --registros C100 D100
+# A saída é particionada no estilo Hive (CNPJ=.../ANO=...), um arquivo por EFD de entrada,
+# nomeado <arquivo>.<hash do caminho completo> para que arquivos de mesmo nome em pastas
+# diferentes não se sobrescrevam; os totais de resumo ficam em <saida>/_resumos/<nome>.json e os
+# índices de posições (indice_efd), reaproveitados entre execuções, em <saida>/_indices
+# (o "_" faz a leitura do dataset ignorar as pastas).
+# Entradas que gravariam na mesma saída (o mesmo arquivo por caminhos diferentes) interrompem
+# a execução antes do processamento. O código de saída é 1 se algum arquivo falhar, inclusive por linhas inválidas ou
+# participantes/itens ausentes do bloco 0 (esses arquivos não são gravados, salvo com --tolerar-erros).
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Processa arquivos EFD Contribuições em lote.")
+    parser.add_argument("entradas", nargs="+", help="Arquivos ou padrões glob (ex.: 'dados/**/*.txt')")
+    parser.add_argument("--saida", required=True, help="Diretório de saída")
+    parser.add_argument("--formato", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processos em paralelo")
+    parser.add_argument("--registros", nargs="+", choices=list(FAMILIAS), metavar="REGISTRO",
+                        help=f"Famílias de registros a extrair ({', '.join(FAMILIAS)}); padrão: todas")
+    parser.add_argument("--tolerar-erros", action="store_true",
+                        help="Grava os arquivos com linhas inválidas ou referências não encontradas no bloco 0")
+    args = parser.parse_args(argumentos)
+
+    caminhos = listar_entradas(args.entradas)
+    if not caminhos:
+        print("Nenhum arquivo encontrado.", file=sys.stderr)
+        return 1
+    repetidos = nomes_repetidos(caminhos)
+    if repetidos:
+        for nome, origens in repetidos.items():
+            print(f"ERRO saída {nome} repetida para: {', '.join(origens)}", file=sys.stderr)
+        return 1
+
+    falhas = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futuros = {
+            pool.submit(processar_e_gravar, caminho, args.saida, args.formato, args.registros, args.tolerar_erros): caminho
+            for caminho in caminhos
+        }
+        for futuro in as_completed(futuros):
+            caminho = futuros[futuro]
+            try:
+                linhas = futuro.result()
+            except Exception as e:
+                falhas += 1
+                print(f"ERRO {caminho}: {e}", file=sys.stderr)
+            else:
+                print(f"OK {caminho}: {linhas} linhas", file=sys.stderr)
+
+    print(f"{len(caminhos) - falhas} de {len(caminhos)} arquivos processados.", file=sys.stderr)
+    return 1 if falhas else 0
+
+def listar_entradas(entradas):
+    caminhos = []
+    for entrada in entradas:
+        if glob.has_magic(entrada):
+            caminhos.extend(c for c in sorted(glob.glob(entrada, recursive=True)) if os.path.isfile(c))
+        else:
+            # Caminhos explícitos seguem mesmo se não existirem, para a falha aparecer no relatório
+            caminhos.append(entrada)
+    return list(dict.fromkeys(caminhos))
+
+def nome_saida(caminho):
+    # Nome do arquivo e hash do caminho completo, como em indice_efd.caminho_indice
+    identificador = hashlib.sha1(os.path.abspath(caminho).encode()).hexdigest()[:16]
+    return f"{os.path.splitext(os.path.basename(caminho))[0]}.{identificador}"
+
+def nomes_repetidos(caminhos):
+    # Entradas que gravariam na mesma saída (ex.: o mesmo arquivo por caminhos diferentes)
+    origens = {}
+    for caminho in caminhos:
+        origens.setdefault(nome_saida(caminho), []).append(caminho)
+    return {nome: lista for nome, lista in origens.items() if len(lista) > 1}
+
+def processar_e_gravar(caminho, saida, formato, familias=None, tolerar_erros=False):
+    # Executado no processo de trabalho: o resultado é gravado lá mesmo, sem voltar pelo pool
+    with open(caminho, 'rb') as arquivo:
+        if arquivo.read(6) != b'|0000|':
+            raise ValueError("registro 0000 ausente na primeira linha")
+    df = processar_caminho(caminho, familias=familias, diretorio_indice=os.path.join(saida, "_indices"))
+    inconsistencias = df.attrs.pop('inconsistencias')
+    if any(inconsistencias.values()) and not tolerar_erros:
+        raise ValueError(
+            f"{inconsistencias['linhas_invalidas']} linhas inválidas e "
+            f"{inconsistencias['referencias_pendentes']} linhas com participante/item ausente do bloco 0"
+        )
+    nome = nome_saida(caminho)
+    gravar_resumo(df.attrs.pop('resumo'), saida, nome)
+    gravar_resultado(df, saida, formato, nome)
+    return len(df)
+
+def gravar_resumo(resumo, saida, nome):
+    diretorio = os.path.join(saida, "_resumos")
+    os.makedirs(diretorio, exist_ok=True)
+    with open(os.path.join(diretorio, f"{nome}.json"), 'w', encoding='utf-8') as arquivo:
+        json.dump(resumo, arquivo, ensure_ascii=False)
+
+def gravar_resultado(df, saida, formato, nome):
+    for (cnpj, ano), grupo in df.groupby(['CNPJ', 'ANO'], sort=False, observed=True):
+        diretorio = os.path.join(saida, f"CNPJ={cnpj}", f"ANO={ano}")
+        os.makedirs(diretorio, exist_ok=True)
+        if formato == "parquet":
+            # As colunas de partição ficam só no caminho, como espera a leitura de datasets Hive
+            grupo.drop(columns=['CNPJ', 'ANO']).to_parquet(os.path.join(diretorio, f"{nome}.parquet"), index=False)
+        else:
+            grupo.to_csv(
+                os.path.join(diretorio, f"{nome}.csv"),
+                sep=';', decimal=',', date_format='%d/%m/%Y', index=False, encoding='utf-8-sig',
+            )
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,38 @@
+import numpy as np
 import pandas as pd
 import glob
+import hashlib
+import json
+import multiprocessing
 import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import streamlit as st
 import streamlit_authenticator as stauth
 import yaml
 from yaml.loader import SafeLoader
+from indice_efd import gravar_arrays, origem_indice
+from instrumentacao import Perfil, ProcessamentoCancelado, Progresso, fase
+from processador_efd import (
+    COLUNAS_ALIQUOTA,
+    COLUNAS_DATA,
+    COLUNAS_VALOR,
+    FAMILIAS,
+    VALORES_RESUMO,
+    arquivo_vazio,
+    combinar_resumos,
+    concatenar_resultados,
+    mapear_arquivo,
+    processar_cabecalho,
+    processar_caminho,
+    processar_caminho_paralelo,
+    processar_versao,
+)
 
 
 
@@ -32,31 +60,98 @@ def main():
         # Sidebar com input de arquivo
         st.sidebar.image("logo.png", use_container_width=True)
         st.sidebar.title("Configurações")
-        uploaded_file = st.sidebar.file_uploader("Selecione o arquivo EFD:", type=["txt"])
-
-        # Botão para processar arquivos
-        if st.button("Processar Arquivos"):
-            if not uploaded_file:
+        origem = st.sidebar.radio("Origem dos arquivos:", ["Upload", "Diretório do servidor"], horizontal=True)
+        if origem == "Upload":
+            uploaded_files = st.sidebar.file_uploader("Selecione os arquivos EFD:", type=["txt"], accept_multiple_files=True)
+        else:
+            # Arquivos já presentes no servidor: lidos por mmap, sem limite de upload nem cópia em memória
+            diretorio = config['ingestao']['diretorio']
+            caminhos = st.sidebar.multiselect(
+                "Selecione os arquivos EFD:",
+                listar_arquivos_servidor(config['ingestao']),
+                format_func=lambda caminho: os.path.relpath(caminho, diretorio),
+            )
+            uploaded_files = [ArquivoServidor(caminho) for caminho in caminhos]
+        por_bloco = st.sidebar.checkbox(
+            "Paralelizar por bloco",
+            help="Divide cada arquivo nos blocos A, C, D e F e processa os trechos em paralelo. Indicado para arquivos grandes.",
+        )
+        selecionadas = st.sidebar.multiselect(
+            "Registros a extrair:",
+            list(FAMILIAS),
+            default=list(FAMILIAS),
+            format_func=FAMILIAS.get,
+            help="Os blocos sem nenhum registro selecionado são pulados na leitura.",
+        )
+        # Com todos os registros, o processamento (e a chave de cache) é o completo
+        familias = None if len(selecionadas) == len(FAMILIAS) else selecionadas
+
+        config_cache = config['cache']
+        perfil = painel_perfil = None
+        if st.session_state["username"] in config.get('admins', []):
+            exibir_estatisticas_cache(config_cache['diretorio'])
+            painel_perfil = st.sidebar.expander("Perfil de execução")
+            if painel_perfil.checkbox("Instrumentar processamento", help="Mede tempo e chamadas por fase e por registro. Ignora os caches."):
+                memoria = painel_perfil.checkbox("Medir memória alocada", help="Usa tracemalloc; o processamento fica bem mais lento.")
+                perfil = Perfil(memoria)
+
+        # Resultados já processados na sessão, por hash do conteúdo dos arquivos (só os
+        # RESULTADOS_SESSAO mais recentes; os demais voltam do cache em disco)
+        resultados = st.session_state.setdefault("resultados", {})
+        ids_arquivos = tuple(arquivo.file_id for arquivo in uploaded_files)
+
+        # Processamento em segundo plano da sessão: só o id fica no session_state, o
+        # trabalho (e o seu andamento) fica no registro compartilhado do servidor
+        podar_trabalhos()
+        trabalho = obter_trabalhos().get(st.session_state.get("trabalho"))
+        if trabalho is None:
+            st.session_state.pop("trabalho", None)
+
+        # Botão para processar arquivos (um processamento por vez em cada sessão)
+        if st.button("Processar Arquivos", disabled=trabalho is not None):
+            if not uploaded_files:
                 st.warning("Por favor, selecione um arquivo EFD para continuar.")
                 return
+            if not selecionadas:
+                st.warning("Por favor, selecione ao menos um registro a extrair.")
+                return
 
-            # Processamento do arquivo selecionado
             try:
-                st.write("**Nome do arquivo:**", uploaded_file.name)
-                content = uploaded_file.read().decode("ISO-8859-1")
-                lines = content.splitlines()  # Dividir conteúdo em linhas
-                # Substitua pela sua função de processamento
-                linhas_processadas = processar_arquivo(lines)
-
-                if linhas_processadas:
-                    df = pd.DataFrame(linhas_processadas)
-                    st.write("Tabela de Resultados:")
-                    st.dataframe(df, hide_index=True)
-                else:
-                    st.warning("Nenhum dado foi processado.")
-
-            except Exception as e:
-                st.error(f"Erro ao processar o arquivo {uploaded_file.name}: {e}")
+                chaves = [chave_selecao(calcular_hash_arquivo(arquivo), familias) for arquivo in uploaded_files]
+            except (OSError, ValueError) as e:
+                st.error(f"Erro ao ler os arquivos: {e}")
+                return
+            chave = chaves[0] if len(chaves) == 1 else hashlib.sha256("".join(chaves).encode()).hexdigest()
+            if chave not in resultados or perfil:
+                trabalho = iniciar_trabalho(uploaded_files, chaves, chave, ids_arquivos, config, por_bloco, perfil, familias)
+                st.session_state["trabalho"] = trabalho.id
+            else:
+                guardar_resultado(resultados, chave, resultados[chave])
+                st.session_state["arquivo_atual"] = (ids_arquivos, chave)
+
+        if trabalho is not None:
+            if trabalho.futuro.done():
+                concluir_trabalho(trabalho, resultados)
+            else:
+                acompanhar_trabalho(trabalho.id)
+
+        # Reexecuções (filtros, colunas, download) reaproveitam o resultado guardado
+        arquivo_atual = st.session_state.get("arquivo_atual")
+        if uploaded_files and arquivo_atual and arquivo_atual[0] == ids_arquivos:
+            st.write("**Arquivos:**", ", ".join(arquivo.name for arquivo in uploaded_files))
+            df, resumo, diferencas = resultados[arquivo_atual[1]]
+            if diferencas:
+                exibir_diferencas(diferencas)
+            if not df.empty:
+                nome = uploaded_files[0].name if len(uploaded_files) == 1 else "resultado_efd.txt"
+                exibir_resumo(resumo)
+                with fase(st.session_state.get("perfil") if perfil else None, 'renderização'):
+                    exibir_resultados(df, arquivo_atual[1], nome)
+            else:
+                st.warning("Nenhum dado foi processado.")
+
+        if painel_perfil and st.session_state.get("perfil"):
+            exibir_perfil(painel_perfil, st.session_state["perfil"])
 
     elif st.session_state["authentication_status"] is False:
         st.error('Usuário/Senha is inválido')
@@ -66,982 +161,640 @@ def main():
     
 
 
-def processar_arquivo(linhas):
-    participantes = []
-    produtos_servicos = []
-    linhas_processadas = []
-    cabecalho = {}
-
-    for line in linhas:
-        if line.startswith('|0000|'):
-            cabecalho = processar_cabecalho(line)
-        elif line.startswith('|0150|'):
-            participantes.append(processar_participante(line))
-        elif line.startswith('|0200|'):
-            produtos_servicos.append(processar_produtos_servicos(line))
-
-    df_participantes = pd.DataFrame(participantes)
-    df_produtos_servicos = pd.DataFrame(produtos_servicos)
-
-    #registro_a100, registro_c100 = None, None
-    for line in linhas:
-        # Processando registros A100 (Nota Fiscal de Serviço)
-        if line.startswith('|A100|'):
-            registro_a100 = processar_registro_a100(line, cabecalho, df_participantes)
-        elif line.startswith('|A170|') and registro_a100:
-            linha_processada = processar_registro_a170(line, registro_a100, df_produtos_servicos)
-            if linha_processada:
-                linhas_processadas.append(linha_processada)
-        
-        # Processando registros A170 (Itens da Nota Fiscal de Serviço)
-        elif line.startswith('|C100|'):
-            registro_c100 = processar_registro_c100(line, cabecalho, df_participantes)
-        elif line.startswith('|C170|') and registro_c100:
-            linha_processada = processar_registro_c170(line, registro_c100, df_produtos_servicos)
-            if linha_processada:
-                linhas_processadas.append(linha_processada)
-        
-        # Processando registros C500 (Nota Fiscal contas Agua Luz Gas)
-        elif line.startswith('|C500|'):
-            registro_c500 = processar_registro_c500(line, cabecalho, df_participantes)
-        elif line.startswith('|C501|'):
-            registro_c501 = processar_registro_c501(line, registro_c500)
-        elif line.startswith('|C505|'):
-            registro_c505 = processar_registro_c505(line, registro_c501)
-            if registro_c505:
-                linhas_processadas.append(registro_c505)
-        
-        # Processando registros D100 (Aquisição de Seviço de Tranporte)
-        elif line.startswith('|D100|'):
-            registro_d100,vl_icms, bc_icms = processar_registro_d100(line, cabecalho, df_participantes)
-        elif line.startswith('|D101|'):
-            registro_d101 = processar_registro_d101(line, registro_d100, vl_icms, bc_icms)
-        elif line.startswith('|D105|'):
-            registro_d105 = processar_registro_d105(line, registro_d101)
-            if registro_d105:
-                linhas_processadas.append(registro_d105)
-        
-        # Processando registros D200 (Nota Fiscal de Seviço de Tranporte)
-        elif line.startswith('|D200|'):
-            registro_d200, cfop = processar_registro_d200(line, cabecalho)
-        elif line.startswith('|D201|'):
-            registro_d201,cst_pis,bc_pis,ali_pis,vl_pis = processar_registro_d201(line, registro_d200, cfop)   
-        elif line.startswith('|D205|'):
-            registro_d205 = processar_registro_d205(line, registro_d201,cst_pis,bc_pis,ali_pis,vl_pis)
-            if registro_d205:
-                linhas_processadas.append(registro_d205)
-        
-        # Processando registros D500 (Nota Fiscal Comunicação)
-        elif line.startswith('|D500|'):
-            registro_d500 = processar_registro_d500(line, cabecalho, df_participantes)
-        elif line.startswith('|D501|'):
-            registro_d501 = processar_registro_d501(line, registro_d500)
-        elif line.startswith('|D505|'):
-            registro_d505 = processar_registro_d505(line, registro_d501)
-            if registro_d505:
-                linhas_processadas.append(registro_d505)
-        
-        #Demais Documentos e Operações
-        elif line.startswith('|F100|'):
-            registro_f100 = processar_registro_f100(line, cabecalho)
-            if registro_f100:
-                linhas_processadas.append(registro_f100)
-
-
-    return linhas_processadas
-
-# Funções auxiliares
-def define_enumeradores(tipo, valor):
-    if tipo == "Tipo Operação":       
-        data = {
-            0: "0 - Entrada",
-            1: "1 - Saída",
-        }
-        return data.get(valor, "Opção inválida")
-    elif tipo == "Situação":
-        data = {
-            0: "00 - Documento regular",
-            1: "02 - Documento cancelado",
-        }
-        return data.get(valor, "Opção inválida")
-    elif tipo == "UF":
-        data = {
-            12: "AC",  # Acre
-            27: "AL",  # Alagoas
-            13: "AM",  # Amazonas
-            16: "AP",  # Amapá
-            29: "BA",  # Bahia
-            23: "CE",  # Ceará
-            53: "DF",  # Distrito Federal
-            32: "ES",  # Espírito Santo
-            52: "GO",  # Goiás
-            21: "MA",  # Maranhão
-            31: "MG",  # Minas Gerais
-            50: "MS",  # Mato Grosso do Sul
-            51: "MT",  # Mato Grosso
-            15: "PA",  # Pará
-            25: "PB",  # Paraíba
-            26: "PE",  # Pernambuco
-            22: "PI",  # Piauí
-            41: "PR",  # Paraná
-            33: "RJ",  # Rio de Janeiro
-            24: "RN",  # Rio Grande do Norte
-            43: "RS",  # Rio Grande do Sul
-            11: "RO",  # Rondônia
-            14: "RR",  # Roraima
-            42: "SC",  # Santa Catarina
-            35: "SP",  # São Paulo
-            28: "SE",  # Sergipe
-            17: "TO",  # Tocantins
-        }
-        return data.get(valor, "Opção inválida")
-
-def formatar_data(valor):
+class Trabalho:
+    # Processamento de um conjunto de arquivos em segundo plano. O andamento de cada
+    # arquivo (ou trecho) é publicado pelos processos de trabalho em 'andamento', um
+    # dicionário do gerenciador de processos (ver instrumentacao.Progresso).
+    def __init__(self, arquivos, chave, ids_arquivos, andamento, perfil=None):
+        self.id = uuid.uuid4().hex
+        self.nomes = [arquivo.name for arquivo in arquivos]
+        self.chave = chave
+        self.ids_arquivos = ids_arquivos
+        # Bytes previstos dos arquivos ainda não iniciados (depois, os publicados em 'andamento')
+        self.tamanhos = [arquivo.size for arquivo in arquivos]
+        self.andamento = andamento
+        self.perfil = perfil
+        self.erros = []
+        self.avisos = []
+        # Futuros do pool, cancelados se ainda não tiverem começado
+        self.futuros = []
+        # Arquivo -> (linhas lidas, bytes lidos, linhas geradas, bytes previstos) dos já concluídos
+        self.concluidos = {}
+        self.cancelado = False
+        self.inicio = None
+        self.futuro = None
+        self.concluido = None
+
+    def progresso(self, indice):
+        return Progresso(self.andamento, str(indice))
+
+    def concluir_arquivo(self, indice, geradas):
+        # Concluído, o arquivo conta como inteiramente lido (nada lido, se veio do cache)
+        lidas, lidos, _, _ = self.somar_arquivos().get(str(indice), (0, 0, 0, 0))
+        self.concluidos[str(indice)] = (lidas, lidos, geradas, lidos)
+
+    def somar_arquivos(self):
+        # Arquivo -> (linhas lidas, bytes lidos, linhas geradas, bytes previstos), somando os trechos
+        arquivos = {}
+        for chave, valor in self.andamento.copy().items():
+            if chave == 'cancelado':
+                continue
+            lidas, lidos, geradas, previstos = valor
+            totais = arquivos.setdefault(chave.split('/')[0], [0, 0, 0, 0])
+            totais[0] += lidas
+            totais[1] += lidos
+            totais[2] += geradas
+            totais[3] += lidos if previstos is None else previstos
+        return arquivos
+
+    def somar(self):
+        # (linhas lidas, bytes lidos, linhas geradas, bytes previstos) de todos os arquivos;
+        # os ainda não iniciados entram com o tamanho inteiro como previsto
+        arquivos = self.somar_arquivos()
+        arquivos.update(self.concluidos)
+        for indice, tamanho in enumerate(self.tamanhos):
+            arquivos.setdefault(str(indice), (0, 0, 0, tamanho))
+        return tuple(map(sum, zip((0, 0, 0, 0), *arquivos.values())))
+
+    def avisar_inconsistencias(self, nome, inconsistencias):
+        # Contagens de df.attrs['inconsistencias'] (ausentes em resultados de versões antigas do cache)
+        if inconsistencias and any(inconsistencias.values()):
+            self.avisos.append(
+                f"Arquivo {nome}: {inconsistencias['linhas_invalidas']} linhas inválidas descartadas e "
+                f"{inconsistencias['referencias_pendentes']} linhas com participante/item ausente do bloco 0."
+            )
+
+    def cancelar(self):
+        self.cancelado = True
+        self.andamento['cancelado'] = True
+        for futuro in self.futuros:
+            futuro.cancel()
+
+def iniciar_trabalho(arquivos, chaves, chave, ids_arquivos, config, por_bloco=False, perfil=None, familias=None):
+    # Envia o processamento ao executor de trabalhos (limitado) e o registra pelo id
+    trabalho = Trabalho(arquivos, chave, ids_arquivos, obter_gerenciador().dict(), perfil)
+
+    def executar():
+        trabalho.inicio = time.time()
+        try:
+            resultado = processar_arquivos(arquivos, chaves, config, por_bloco, perfil, familias, trabalho)
+        finally:
+            trabalho.concluido = time.time()
+        # Cancelado no fim do processamento: o resultado não é exibido, nem mantido no registro
+        return None if trabalho.cancelado else resultado
+
+    executor = obter_executor_trabalhos(config['processamento'].get('max_trabalhos', 2))
+    trabalho.futuro = executor.submit(executar)
+    obter_trabalhos()[trabalho.id] = trabalho
+    return trabalho
+
+# Segundos que um trabalho concluído espera ser recolhido pela sua sessão (que acompanha
+# o andamento a cada segundo); depois disso a sessão foi encerrada e ele é descartado
+TEMPO_RECOLHIMENTO = 300
+
+def podar_trabalhos():
+    # Chamado a cada execução e atualização do andamento de qualquer sessão, para não
+    # manter os resultados de trabalhos abandonados
+    trabalhos = obter_trabalhos()
+    agora = time.time()
+    for id_trabalho, trabalho in list(trabalhos.items()):
+        if trabalho.concluido and agora - trabalho.concluido > TEMPO_RECOLHIMENTO:
+            trabalhos.pop(id_trabalho, None)
+
+def concluir_trabalho(trabalho, resultados):
+    obter_trabalhos().pop(trabalho.id, None)
+    st.session_state.pop("trabalho", None)
+    for erro in trabalho.erros:
+        st.error(erro)
+    for aviso in trabalho.avisos:
+        st.warning(aviso)
+    if trabalho.cancelado:
+        st.warning("Processamento cancelado.")
+        return
+    try:
+        resultado = trabalho.futuro.result()
+    except Exception as e:
+        st.error(f"Erro ao processar os arquivos: {e}")
+        return
+    if resultado is None:
+        return
+    guardar_resultado(resultados, trabalho.chave, resultado)
+    st.session_state["arquivo_atual"] = (trabalho.ids_arquivos, trabalho.chave)
+    if trabalho.perfil:
+        st.session_state["perfil"] = trabalho.perfil
+        print(f"Perfil de execução ({', '.join(trabalho.nomes)}): "
+              f"{json.dumps(trabalho.perfil.resumo(), ensure_ascii=False)}")
+
+@st.fragment(run_every=1)
+def acompanhar_trabalho(id_trabalho):
+    # Atualizado a cada segundo sem reexecutar a página; ao terminar, reexecuta tudo
+    # para exibir o resultado
+    podar_trabalhos()
+    trabalho = obter_trabalhos().get(id_trabalho)
+    if trabalho is None or trabalho.futuro.done():
+        st.rerun()
+    if trabalho.inicio is None:
+        st.info("Processamento na fila, aguardando os anteriores terminarem.")
+        st.button("Cancelar", on_click=trabalho.cancelar, key="cancelar_trabalho")
+        return
+
+    lidas, lidos, geradas, previstos = trabalho.somar()
+    fracao = min(lidos / previstos, 1.0) if previstos else 0.0
+    decorrido = time.time() - trabalho.inicio
+    st.progress(fracao, text=f"{len(trabalho.concluidos)} de {len(trabalho.nomes)} arquivos ({fracao:.0%})")
+    esquerda, direita, terceira = st.columns(3)
+    esquerda.metric("Linhas lidas", f"{lidas:,}".replace(',', '.'))
+    direita.metric("Linhas geradas", f"{geradas:,}".replace(',', '.'))
+    terceira.metric("Tempo restante", f"{decorrido * (1 - fracao) / fracao:.0f} s" if fracao else "-")
+    st.button("Cancelar", on_click=trabalho.cancelar, disabled=trabalho.cancelado, key="cancelar_trabalho")
+
+# Resultados completos mantidos na memória de cada sessão
+RESULTADOS_SESSAO = 2
+
+def guardar_resultado(resultados, chave, resultado):
+    # O resultado usado por último vai para o fim; os mais antigos além do limite são descartados
+    resultados.pop(chave, None)
+    resultados[chave] = resultado
+    while len(resultados) > RESULTADOS_SESSAO:
+        resultados.pop(next(iter(resultados)))
+
+def processar_arquivos(arquivos, chaves, config, por_bloco=False, perfil=None, familias=None, trabalho=None):
+    # Cada arquivo vem do cache em disco ou é processado em um processo do pool;
+    # os resultados são concatenados na ordem de upload com a coluna 'Arquivo'.
+    # Com 'por_bloco', os arquivos são tratados um de cada vez e o pool recebe
+    # os trechos de cada um (coordenados por uma thread auxiliar). Com 'perfil',
+    # o cache em disco não é lido e as medições de cada arquivo são somadas nele.
+    # 'familias' restringe os registros extraídos (ver processador_efd.FAMILIAS).
+    # No processamento completo e sem 'por_bloco', uma versão anterior do mesmo CNPJ/período
+    # no cache (ex.: o original de uma retificadora) é reaproveitada: só os documentos
+    # alterados são processados (ver processador_efd.processar_versao).
+    # Os uploads são gravados em arquivos temporários, lidos pelos processos do pool por mmap
+    # como os arquivos do servidor, em vez de enviados em bytes (uma cópia a mais em cada lado).
+    # Com 'trabalho' (execução em segundo plano), o andamento é publicado nele, os erros
+    # ficam em trabalho.erros e o cancelamento interrompe os arquivos em andamento.
+    # Retorna (DataFrame, resumo, diferenças por arquivo em relação à versão anterior).
+    trabalho = trabalho or Trabalho(arquivos, None, None, {})
+    config_cache = config['cache']
+    incremental = perfil is None and familias is None and not por_bloco
+    resultados = {}
+    diferencas = {}
+    futuros = {}
+    temporarios = []
+    coordenador = ThreadPoolExecutor(max_workers=1)
     try:
-        return f"{valor[:2]}/{valor[2:4]}/{valor[4:]}" 
-    except:
+        for indice, (arquivo, chave) in enumerate(zip(arquivos, chaves)):
+            if trabalho.cancelado:
+                break
+            df = None if perfil else ler_cache(config_cache['diretorio'], chave)
+            if df is not None:
+                resultados[indice] = df
+                trabalho.concluir_arquivo(indice, len(df))
+                trabalho.avisar_inconsistencias(arquivo.name, df.attrs.get('inconsistencias'))
+                continue
+            pool = obter_pool(config['processamento']['max_workers'])
+            perfil_arquivo = Perfil(perfil.memoria) if perfil else None
+            progresso = trabalho.progresso(indice)
+            if isinstance(arquivo, ArquivoServidor):
+                caminho, diretorio_indice = arquivo.caminho, config_cache['diretorio']
+            else:
+                # O índice de um temporário não é reaproveitado nem gravado
+                caminho, diretorio_indice = gravar_temporario(arquivo, temporarios), None
+            versao = identificar_versao(arquivo) if incremental else None
+            if incremental:
+                anterior = versao_anterior(config_cache['diretorio'], versao, chave)
+                futuro = pool.submit(processar_versao, caminho, anterior, diretorio_indice, progresso)
+            elif por_bloco:
+                futuro = coordenador.submit(processar_caminho_paralelo, caminho, pool, perfil=perfil_arquivo, familias=familias, progresso=progresso)
+            else:
+                futuro = pool.submit(processar_caminho, caminho, perfil_arquivo, familias, diretorio_indice, progresso)
+            futuros[futuro] = (indice, arquivo, chave, versao)
+            trabalho.futuros.append(futuro)
+
+        for futuro in as_completed(futuros):
+            indice, arquivo, chave, versao = futuros[futuro]
+            try:
+                df = futuro.result()
+            except (CancelledError, ProcessamentoCancelado):
+                continue
+            except BrokenProcessPool:
+                obter_pool.clear()
+                trabalho.erros.append(f"Erro ao processar o arquivo {arquivo.name}: processo de trabalho interrompido")
+                continue
+            except Exception as e:
+                trabalho.erros.append(f"Erro ao processar o arquivo {arquivo.name}: {e}")
+                continue
+            trabalho.concluir_arquivo(indice, len(df))
+            trabalho.avisar_inconsistencias(arquivo.name, df.attrs.get('inconsistencias'))
+            if perfil:
+                perfil.combinar(df.attrs.pop('perfil'))
+            assinatura = df.attrs.pop('assinatura', None)
+            diferenca = df.attrs.pop('diferenca', None)
+            if diferenca:
+                diferencas[arquivo.name] = diferenca
+            # O resumo vai junto para o cache, nos metadados do Parquet (df.attrs). Uma falha na
+            # gravação não perde o resultado já processado
+            try:
+                gravar_cache(config_cache['diretorio'], chave, df, config_cache['tamanho_maximo_mb'])
+                if assinatura is not None and versao:
+                    gravar_arrays(caminho_assinatura(config_cache['diretorio'], chave), assinatura)
+                    registrar_versao(config_cache['diretorio'], versao, chave)
+            except Exception as e:
+                trabalho.avisos.append(f"Resultado do arquivo {arquivo.name} não gravado no cache: {e}")
+            resultados[indice] = df
+    finally:
+        coordenador.shutdown()
+        for diretorio in temporarios:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    if not resultados or trabalho.cancelado:
         return None
+    resumo = combinar_resumos([resultados[indice].attrs.pop('resumo') for indice in sorted(resultados)])
+    with fase(perfil, 'montagem DataFrame'):
+        df = concatenar_resultados([
+            resultados[indice].assign(Arquivo=pd.Categorical.from_codes(
+                np.zeros(len(resultados[indice]), dtype=np.int8), [arquivos[indice].name],
+            ))
+            for indice in sorted(resultados)
+        ])
+    return df, resumo, diferencas
+
+class ArquivoServidor:
+    # Arquivo EFD do diretório de ingestão, com a mesma interface mínima do UploadedFile
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.name = os.path.basename(caminho)
+        # Muda quando o arquivo é alterado, como o file_id de um novo upload
+        estatistica = os.stat(caminho)
+        self.file_id = (caminho, estatistica.st_size, estatistica.st_mtime_ns)
+        self.size = estatistica.st_size
+
+def gravar_temporario(arquivo, temporarios):
+    # Copia o upload em blocos para um diretório temporário próprio (incluído em 'temporarios')
+    diretorio = tempfile.mkdtemp(prefix="efd_")
+    temporarios.append(diretorio)
+    caminho = os.path.join(diretorio, os.path.basename(arquivo.name))
+    arquivo.seek(0)
+    with open(caminho, 'wb') as destino:
+        shutil.copyfileobj(arquivo, destino, 1 << 20)
+    arquivo.seek(0)
+    return caminho
+
+def listar_arquivos_servidor(config_ingestao):
+    padrao = os.path.join(config_ingestao['diretorio'], config_ingestao['padrao'])
+    return sorted(glob.glob(padrao, recursive=True))
+
+def calcular_hash_arquivo(arquivo):
+    if not isinstance(arquivo, ArquivoServidor):
+        return calcular_hash(arquivo)
+    if arquivo_vazio(arquivo.caminho):
+        return hashlib.sha256().hexdigest()
+    mapa = mapear_arquivo(arquivo.caminho)
+    try:
+        return calcular_hash(mapa)
+    finally:
+        mapa.close()
+
+def chave_selecao(chave, familias):
+    # Resultados de uma seleção parcial de registros têm chave (e cache) próprios
+    if familias is None:
+        return chave
+    return hashlib.sha256(f"{chave}:{','.join(sorted(familias))}".encode()).hexdigest()
+
+@st.cache_resource
+def obter_pool(max_workers):
+    # Pool compartilhado entre sessões; 'spawn' evita fork do servidor com threads ativas
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+@st.cache_resource
+def obter_executor_trabalhos(max_trabalhos):
+    # Threads que coordenam os processamentos em segundo plano de todas as sessões; os
+    # trabalhos além de 'max_trabalhos' aguardam na fila
+    return ThreadPoolExecutor(max_workers=max_trabalhos, thread_name_prefix="trabalho_efd")
+
+@st.cache_resource
+def obter_trabalhos():
+    # Id -> Trabalho, compartilhado entre sessões e reexecuções
+    return {}
+
+@st.cache_resource
+def obter_gerenciador():
+    # Processo que guarda os dicionários de andamento, acessíveis pelo pool de processos
+    return multiprocessing.get_context('spawn').Manager()
+
+def exibir_estatisticas_cache(diretorio):
+    estatisticas = ler_estatisticas_cache(diretorio)
+    arquivos = listar_cache(diretorio)
+    resultados = [caminho for caminho in arquivos if caminho.endswith('.parquet')]
+    with st.sidebar.expander("Cache de arquivos processados"):
+        st.write(f"Acertos: {estatisticas['acertos']}")
+        st.write(f"Falhas: {estatisticas['falhas']}")
+        st.write(f"Resultados: {len(resultados)}")
+        st.write(f"Total (com assinaturas e índices): {len(arquivos)} arquivos, "
+                 f"{sum(tamanho for tamanho, _ in arquivos.values()) / 2**20:.1f} MB")
+
+def exibir_perfil(painel, perfil):
+    resumo = perfil.resumo()
+    painel.write("Fases:")
+    painel.dataframe(pd.DataFrame.from_dict(resumo['fases'], orient='index'))
+    if resumo['registros']:
+        painel.write("Registros:")
+        painel.dataframe(pd.DataFrame.from_dict(resumo['registros'], orient='index').sort_values('total_s', ascending=False))
+    painel.download_button(
+        "Exportar JSON",
+        data=json.dumps(resumo, ensure_ascii=False, indent=2),
+        file_name="perfil_execucao.json",
+        mime="application/json",
+    )
+
+DIMENSOES_PAINEL = {
+    'Registros': ['Registros'],
+    'CST PIS': ['CST PIS'],
+    'Natureza Crédito': ['Natureza Crédito'],
+    'CFOP': ['CFOP'],
+    'Participante': ['Código Participante', 'Nome Participante'],
+}
+
+def exibir_resumo(resumo):
+    # Painel montado só com os totais acumulados na leitura, sem percorrer as linhas de detalhe
+    st.subheader("Resumo")
+    totais = pd.DataFrame(resumo)
+    esquerda, direita, terceira = st.columns(3)
+    esquerda.metric("Vlr PIS", formatar_valor(totais['Vlr PIS'].sum()))
+    direita.metric("Vlr Cofins", formatar_valor(totais['Vlr Cofins'].sum()))
+    terceira.metric("Vlr Item", formatar_valor(totais['Vlr Item'].sum()))
+
+    dimensao = st.selectbox("Agrupar por:", list(DIMENSOES_PAINEL))
+    agrupado = (
+        totais.groupby(DIMENSOES_PAINEL[dimensao], dropna=False)[['Linhas'] + VALORES_RESUMO].sum()
+        .sort_values('Vlr Item', ascending=False)
+        .reset_index()
+    )
+    st.bar_chart(agrupado.head(20), x=DIMENSOES_PAINEL[dimensao][-1], y=['Vlr PIS', 'Vlr Cofins'])
+    st.dataframe(
+        agrupado,
+        hide_index=True,
+        column_config={coluna: st.column_config.NumberColumn(format="%.2f") for coluna in VALORES_RESUMO},
+    )
 
-def processar_cabecalho(line):
-    arq = line.split("|")
+def exibir_diferencas(diferencas):
+    with st.expander("Diferenças em relação à versão anterior", expanded=True):
+        for nome, diferenca in diferencas.items():
+            tabela = pd.DataFrame(diferenca)
+            st.write(
+                f"**{nome}**: {tabela['Iguais'].sum()} documentos reaproveitados, "
+                f"{tabela['Novos/alterados'].sum()} processados (novos ou alterados) e "
+                f"{tabela['Removidos/alterados'].sum()} da versão anterior removidos ou alterados."
+            )
+            st.dataframe(tabela, hide_index=True)
+
+def formatar_valor(valor):
+    # 1234567.8 -> "1.234.567,80"
+    return f"{valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+def exibir_resultados(df, chave, nome_arquivo):
+    # Filtros e paginação no servidor: o resultado fica em memória aqui e só a
+    # página visível é enviada ao navegador, qualquer que seja o tamanho total.
+    opcoes = opcoes_filtros(df, chave)
+    esquerda, direita = st.columns(2)
+    filtros = {
+        'Registros': tuple(esquerda.multiselect("Registros:", opcoes['Registros'])),
+        'CNPJ': tuple(direita.multiselect("CNPJ:", opcoes['CNPJ'])),
+        'CST': tuple(esquerda.multiselect("CST PIS/Cofins:", opcoes['CST'])),
+        'CFOP': tuple(direita.multiselect("CFOP:", opcoes['CFOP'])),
+    }
+    if opcoes['datas']:
+        periodo = st.date_input("Data do documento:", value=opcoes['datas'], format="DD/MM/YYYY")
+        # Sem alteração do intervalo completo, documentos sem data continuam na tabela
+        if len(periodo) == 2 and tuple(periodo) != opcoes['datas']:
+            filtros['Data Documento'] = tuple(periodo)
+    colunas = st.multiselect("Colunas:", list(df.columns), default=list(df.columns))
+
+    filtros = tuple(filtros.items())
+    indices = filtrar_indices(df, chave, filtros)
+
+    esquerda, direita = st.columns(2)
+    tamanho_pagina = esquerda.selectbox("Linhas por página:", [100, 500, 1000, 5000])
+    paginas = max(-(-len(indices) // tamanho_pagina), 1)
+    pagina = direita.number_input(f"Página (de {paginas}):", min_value=1, max_value=paginas, value=1)
+    inicio = (pagina - 1) * tamanho_pagina
+
+    st.write(f"Tabela de Resultados: {len(indices):,} linhas".replace(',', '.'))
+    st.dataframe(
+        df.iloc[indices[inicio:inicio + tamanho_pagina]][colunas],
+        hide_index=True,
+        column_config=configurar_colunas(),
+    )
+    # O CSV do resultado filtrado inteiro só é gerado a pedido, fora do caminho da página;
+    # só o último gerado fica na sessão, enquanto os filtros e as colunas forem os mesmos
+    selecao = (chave, filtros, tuple(colunas))
+    if st.session_state.get("csv", (None,))[0] != selecao:
+        st.session_state.pop("csv", None)
+        if st.button("Gerar CSV"):
+            with st.spinner("Gerando CSV..."):
+                st.session_state["csv"] = (selecao, gerar_csv(df, colunas, indices))
+    if "csv" in st.session_state:
+        st.download_button(
+            "Baixar CSV",
+            data=st.session_state["csv"][1],
+            file_name=f"{os.path.splitext(nome_arquivo)[0]}.csv",
+            mime="text/csv",
+        )
+
+@st.cache_data(max_entries=4)
+def opcoes_filtros(_df, chave):
+    # Valores distintos das colunas filtráveis, calculados uma vez por resultado
+    datas = _df['Data Documento'].dropna()
     return {
-        'CNPJ': arq[9].strip(),
-        'Período': formatar_data(arq[6]),
-        'ANO': arq[6][4:8],
+        'Registros': sorted(_df['Registros'].unique()),
+        'CNPJ': sorted(_df['CNPJ'].unique()),
+        'CST': sorted((set(_df['CST PIS'].unique()) | set(_df['CST Cofins'].unique())) - {''}),
+        'CFOP': sorted(set(_df['CFOP'].unique()) - {''}),
+        'datas': (datas.min().date(), datas.max().date()) if len(datas) else None,
     }
 
-def processar_participante(line):
-    campos = line.split('|')
-    try:
-        return {
-            'Código': campos[2],  
-            'Nome': campos[3].replace(';',''),
-            'CNPJ': campos[5],  
-            'CPF': campos[6],
-            'Código Municipio': campos[8],
-        }
-    except:
-        return {
-            'Código': '',  
-            'Nome': '',
-            'CNPJ': '',  
-            'CPF': '',
-            'Código Municipio': '',
-        }
-
-def processar_produtos_servicos(line):
-    campos = line.split('|')
-    try:
-        return {
-            'Código': campos[2],  
-            'Descrição': campos[3].replace(';',''),
-            'Código Barra': campos[4],  
-            'Tipo': campos[7],
-            'Código NCM': campos[8],
-            'Código Serviço': campos[11],
-            'Aliquota ICMS': campos[12],
-            'Unidade Medida': campos[6],
-        }
-    except IndexError:
+@st.cache_data(max_entries=16)
+def filtrar_indices(_df, chave, filtros):
+    # Posições das linhas que atendem a todos os filtros
+    mascara = np.ones(len(_df), dtype=bool)
+    for coluna, valores in filtros:
+        if not valores:
+            continue
+        if coluna == 'CST':
+            mascara &= (_df['CST PIS'].isin(valores) | _df['CST Cofins'].isin(valores)).to_numpy()
+        elif coluna == 'Data Documento':
+            inicio, fim = pd.Timestamp(valores[0]), pd.Timestamp(valores[1]) + pd.Timedelta(days=1)
+            mascara &= ((_df[coluna] >= inicio) & (_df[coluna] < fim)).to_numpy()
+        else:
+            mascara &= _df[coluna].isin(valores).to_numpy()
+    return np.flatnonzero(mascara)
+
+def gerar_csv(df, colunas, indices):
+    return df.iloc[indices][colunas].to_csv(
+        sep=';', decimal=',', date_format='%d/%m/%Y', index=False,
+    ).encode('utf-8-sig')
+
+def calcular_hash(arquivo, tamanho_bloco=1 << 20):
+    # SHA-256 do conteúdo, lido em blocos para não copiar o arquivo inteiro
+    arquivo.seek(0)
+    sha256 = hashlib.sha256()
+    for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+        sha256.update(bloco)
+    arquivo.seek(0)
+    return sha256.hexdigest()
+
+# Cache em disco dos resultados, compartilhado entre sessões e reinícios. A chave é o
+# SHA-256 do arquivo mais a versão do parser: alterações na saída de processar_arquivo
+# devem incrementar VERSAO_PARSER para invalidar resultados antigos.
+VERSAO_PARSER = "4"
+trava_cache = threading.Lock()
+
+def caminho_cache(diretorio, chave):
+    return os.path.join(diretorio, f"{chave}.v{VERSAO_PARSER}.parquet")
+
+def caminho_assinatura(diretorio, chave):
+    # Hashes e linhas por documento do resultado em cache, para o reprocessamento incremental
+    return os.path.join(diretorio, f"{chave}.v{VERSAO_PARSER}.assinatura.npz")
+
+def identificar_versao(arquivo):
+    # "CNPJ|período" do registro 0000, que identifica as versões (original e retificadoras)
+    if isinstance(arquivo, ArquivoServidor):
+        with open(arquivo.caminho, 'rb') as leitura:
+            linha = leitura.readline()
+    else:
+        arquivo.seek(0)
+        linha = arquivo.readline()
+        arquivo.seek(0)
+    if not linha.startswith(b'|0000|'):
         return None
+    cabecalho = processar_cabecalho(linha.rstrip(b'\r\n'), None)
+    return f"{cabecalho.cnpj}|{cabecalho.periodo}"
 
-def processar_registro_a100(line, cabecalho, df_participantes):
-    campos = line.split('|')
-    try:
-        return {
-            **cabecalho,
-            'Registros': 'A100/A170 - Nota Fiscal de Serviço',
-            'Tipo Operação': define_enumeradores('Tipo Operação',int(campos[2])),
-            'Situação': define_enumeradores('Situação',int(campos[5])),
-            'Código Participante': campos[4],
-            'CNPJ Participante': df_participantes[df_participantes['Código'] == campos[4]]['CNPJ'].values[0],
-            'CPF Participante': df_participantes[df_participantes['Código'] == campos[4]]['CPF'].values[0],
-            'Nome Participante': df_participantes[df_participantes['Código'] == campos[4]]['Nome'].values[0],
-            'UF Origem/Destino': define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[4]]['Código Municipio'].values[0][:2]))+"/"+define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[4]]['Código Municipio'].values[0][:2])),
-            'Número Documento': campos[8],
-            'Série': campos[6],
-            'Chave NF-e': campos[9],
-            'Data Documento': formatar_data(campos[10]),
-            'Data Entrada/Saída': formatar_data(campos[11]),
-            'Vlr Documento': campos[12],
-            'Vlr Desconto NF': campos[14],
-            'Vlr Mercadoria/Operação': '',
-            'Vlr Frete': '',
-            'Vlr ISSQN': campos[21]
-        }
-    except IndexError:
-        print(f"Linha A100 inválida: {line}")
+def versao_anterior(diretorio, versao, chave):
+    # (resultado, assinatura) em cache da última versão processada do mesmo CNPJ/período
+    if not versao:
         return None
-
-def processar_registro_a170(line, pai, df_produtos_servicos):
-    campos = line.split('|')
-    try:
-        return {
-            **pai,
-            'Número Item': campos[2],
-            'Código Item': campos[3],
-            'Descrição Complementar': campos[4].replace(';',''),
-            'Descrição Item': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Descrição'].values[0],
-            'NCM': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Código NCM'].values[0],
-            'Código Serviço': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Código Serviço'].values[0],
-            'Código Barra': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Código Barra'].values[0],
-            'Tipo Item': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Tipo'].values[0],
-            'Vlr Item': campos[5],
-            'Qtde': '',
-            'Unidade Medida': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Unidade Medida'].values[0],
-            'Vlr Desconto Item': campos[6],
-            'Natureza Crédito': campos[7],
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST': '',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-            'pis/cofins': str(float(campos[12])+float(campos[16])).replace(".",","),
-            'CST PIS': campos[9],
-            'Vlr Base Cálculo PIS': campos[10],
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': campos[11],
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': campos[12],
-            'CST Cofins': campos[13],
-            'Vlr Base Cálculo Cofins': campos[14],
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': campos[15],
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': campos[16],
-            'Conta Contábil': campos[17],
-            'Débito/Crédito': '',
-        }
-    except IndexError:
-        print(f"Linha A170 inválida: {line}")
-        return None    
-
-def processar_registro_c100(line, cabecalho, df_participantes):
-    campos = line.split('|')
-    try:
-        return {
-            **cabecalho,
-            'Registros': 'C100/C170 - Documento - Nota Fiscal',
-            'Tipo Operação': define_enumeradores('Tipo Operação',int(campos[2])),
-            'Situação': define_enumeradores('Situação',int(campos[6])),
-            'Código Participante': campos[4],
-            'CNPJ Participante': df_participantes[df_participantes['Código'] == campos[4]]['CNPJ'].values[0],
-            'CPF Participante': df_participantes[df_participantes['Código'] == campos[4]]['CPF'].values[0],
-            'Nome Participante': df_participantes[df_participantes['Código'] == campos[4]]['Nome'].values[0],
-            'UF Origem/Destino': define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[4]]['Código Municipio'].values[0][:2]))+"/"+define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[4]]['Código Municipio'].values[0][:2])),
-            'Número Documento': campos[8],
-            'Série': campos[7],
-            'Chave NF-e': campos[9],
-            'Data Documento': formatar_data(campos[10]),
-            'Data Entrada/Saída': formatar_data(campos[11]),
-            'Vlr Documento': campos[12],
-            'Vlr Desconto NF': campos[14],
-            'Vlr Mercadoria/Operação': campos[16],
-            'Vlr Frete': campos[18],
-            'Vlr ISSQN': '',
-        }
-    except Exception as e:
-        print(f"Linha C100 inválida: {line} - {e}")
+    with trava_cache:
+        chave_anterior = ler_json(os.path.join(diretorio, 'versoes.json'), {}).get(versao)
+    if not chave_anterior or chave_anterior == chave:
         return None
-
-def processar_registro_c170(line, pai, df_produtos_servicos):
-    campos = line.split('|')
+    anterior = (caminho_cache(diretorio, chave_anterior), caminho_assinatura(diretorio, chave_anterior))
+    return anterior if all(os.path.exists(caminho) for caminho in anterior) else None
+
+def registrar_versao(diretorio, versao, chave):
+    with trava_cache:
+        caminho = os.path.join(diretorio, 'versoes.json')
+        versoes = ler_json(caminho, {})
+        versoes[versao] = chave
+        with open(caminho, 'w') as arquivo:
+            json.dump(versoes, arquivo)
+
+def ler_cache(diretorio, chave):
+    caminho = caminho_cache(diretorio, chave)
     try:
-        return {
-            **pai,
-            'Número Item': campos[2],
-            'Código Item': campos[3],
-            'Descrição Complementar': campos[4].replace(';',''),
-            'Descrição Item': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Descrição'].values[0],
-            'NCM': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Código NCM'].values[0],
-            'Código Serviço': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Código Serviço'].values[0],
-            'Código Barra': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Código Barra'].values[0],
-            'Tipo Item': df_produtos_servicos[df_produtos_servicos['Código'] == campos[3]]['Tipo'].values[0],
-            'Vlr Item': campos[7],
-            'Qtde': campos[5],
-            'Unidade Medida': campos[6],
-            'Vlr Desconto Item': campos[8],
-            'Natureza Crédito': campos[12],
-            'CFOP': campos[11],
-            'CFOP Faturamento': '',
-            'CST ICMS': campos[10],
-            'Vlr Base Cálculo ICMS': campos[13],
-            'Alíquota ICMS': campos[14],
-            'Vlr ICMS': campos[15],
-            'Vlr Base Cálculo ICMS ST': campos[16],
-            'Alíquota ICMS ST': campos[17],
-            'Vlr ICMS ST': campos[18],
-            'CST IPI': campos[20],
-            'Vlr Base Cálculo IPI': campos[22],
-            'Alíquota IPI': campos[23],
-            'Vlr IPI': campos[24],
-            'pis/cofins': str(float(campos[30])+float(campos[36])).replace(".",","),
-            'CST PIS': campos[25],
-            'Vlr Base Cálculo PIS': campos[26],
-            'Qtde Base Cálculo PIS': campos[28],
-            'Alíquota PIS': campos[27],
-            'Qtde Alíquota PIS': campos[29],
-            'Vlr PIS': campos[30],
-            'CST Cofins': campos[31],
-            'Vlr Base Cálculo Cofins': campos[32],
-            'Qtde Base Cálculo Cofins': campos[34],
-            'Alíquota Cofins': campos[33],
-            'Qtde Alíquota Cofins': campos[35],
-            'Vlr Cofins': campos[36],
-            'Conta Contábil': campos[37],
-            'Débito/Crédito': '',
-        }
-    except:
-        return {
-            **pai,
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': '',
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': '',
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST': '',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-            'pis/cofins': '',
-            'CST PIS': '',
-            'Vlr Base Cálculo PIS': '',
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': '',
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': '',
-            'CST Cofins': '',
-            'Vlr Base Cálculo Cofins': '',
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': '',
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': '',
-            'Conta Contábil': '',
-            'Débito/Crédito': '',
-        }
-
-def processar_registro_c500(line, cabecalho, df_participantes):
-    campos = line.split('|')
-    try:
-        return {
-            **cabecalho,
-            'Registros': 'C500/C505 - Nota Fiscal/Conta de Energia Elétrica/Água/Gás',
-            'Tipo Operação': define_enumeradores('Tipo Operação', 0),
-            'Situação': define_enumeradores('Situação',int(campos[4])),
-            'Código Participante': campos[2],
-            'CNPJ Participante': df_participantes[df_participantes['Código'] == campos[2]]['CNPJ'].values[0],
-            'CPF Participante': df_participantes[df_participantes['Código'] == campos[2]]['CPF'].values[0],
-            'Nome Participante': df_participantes[df_participantes['Código'] == campos[2]]['Nome'].values[0],
-            'UF Origem/Destino': define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[2]]['Código Municipio'].values[0][:2]))+"/"+define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[2]]['Código Municipio'].values[0][:2])),
-            'Número Documento': campos[7],
-            'Série': campos[5],
-            'Chave NF-e': '',
-            'Data Documento': formatar_data(campos[8]),
-            'Data Entrada/Saída': formatar_data(campos[9]),
-            'Vlr Documento': campos[10],
-            'Vlr Desconto NF': '',
-            'Vlr Mercadoria/Operação': '',
-            'Vlr Frete': '',
-            'Vlr ISSQN': '',
-        }
-    except Exception as e:
-        print(f"Linha C500 inválida: {line} - {e}")
+        df = pd.read_parquet(caminho, memory_map=True)
+    except FileNotFoundError:
+        registrar_estatistica_cache(diretorio, 'falhas')
         return None
-
-def processar_registro_c501(line, pai):
-    campos = line.split('|')
+    # O mtime marca o último uso para a remoção LRU (o arquivo pode ter acabado de ser removido)
     try:
-        return {
-            **pai,
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': campos[3],
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': campos[4],
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST':'',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-            'pis/cofins': '',
-            'CST PIS': campos[2],
-            'Vlr Base Cálculo PIS': campos[5],
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': campos[6],
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': campos[7],
-        }
-    except:
-        return {
-            **pai,
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': '',
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': '',
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST': '',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-            'pis/cofins': '',
-            'CST PIS': '',
-            'Vlr Base Cálculo PIS': '',
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': '',
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': '',
-        }
-
-def processar_registro_c505(line, pai):
-    campos = line.split('|')
-    try:
-        return {
-            **pai,
-            'CST Cofins': campos[2],
-            'Vlr Base Cálculo Cofins': campos[5],
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': campos[6],
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': campos[7],
-            'Conta Contábil': campos[8],
-            'Débito/Crédito': '',
-        }
-    except:
-        return {
-            **pai,
-            'CST Cofins': '',
-            'Vlr Base Cálculo Cofins': '',
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': '',
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': '',
-            'Conta Contábil': '',
-            'Débito/Crédito': '',
-        }
-
-def processar_registro_d100(line, cabecalho, df_participantes):
-    campos = line.split('|')
-    try:
-        return {
-            **cabecalho,
-            'Registros': 'D100/D105 - Aquisição de Serviços de Transporte',
-            'Tipo Operação': define_enumeradores('Tipo Operação',int(campos[2])),
-            'Situação': define_enumeradores('Situação',int(campos[6])),
-            'Código Participante': campos[4],
-            'CNPJ Participante': df_participantes[df_participantes['Código'] == campos[4]]['CNPJ'].values[0],
-            'CPF Participante': df_participantes[df_participantes['Código'] == campos[4]]['CPF'].values[0],
-            'Nome Participante': df_participantes[df_participantes['Código'] == campos[4]]['Nome'].values[0],
-            'UF Origem/Destino': define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[4]]['Código Municipio'].values[0][:2]))+"/"+define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[4]]['Código Municipio'].values[0][:2])),
-            'Número Documento': campos[9],
-            'Série': campos[7],
-            'Chave NF-e': campos[10],
-            'Data Documento': formatar_data(campos[11]),
-            'Data Entrada/Saída': formatar_data(campos[12]),
-            'Vlr Documento': campos[15],
-            'Vlr Desconto NF': campos[16],
-            'Vlr Mercadoria/Operação': campos[18],
-            'Vlr Frete': '',
-            'Vlr ISSQN': '',
-        },campos[20],campos[19]
-    except Exception as e:
-        print(f"Linha D100 inválida: {line} - {e}")
-        return None
-
-def processar_registro_d101(line, pai, vl_icms, bc_icms):
-    campos = line.split('|')
+        os.utime(caminho)
+    except FileNotFoundError:
+        pass
+    registrar_estatistica_cache(diretorio, 'acertos')
+    return df
+
+def gravar_cache(diretorio, chave, df, tamanho_maximo_mb):
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = caminho_cache(diretorio, chave)
+    # Nome único por gravação: sessões (threads do mesmo processo) podem gravar a mesma chave
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
     try:
-        return {
-            **pai,
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': campos[3],
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': campos[5],
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': bc_icms,
-            'Alíquota ICMS': '',
-            'Vlr ICMS': vl_icms,
-            'Vlr Base Cálculo ICMS ST': '',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-            'pis/cofins': '',
-            'CST PIS': campos[4],
-            'Vlr Base Cálculo PIS': campos[6],
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': campos[7],
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': campos[8],
-        }
-    except:
-        return {
-            **pai,
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': '',
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': '',
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST': '',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-            'pis/cofins': '',
-            'CST PIS': '',
-            'Vlr Base Cálculo PIS': '',
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': '',
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': '',
-        }
-
-def processar_registro_d105(line, pai):
-    campos = line.split('|')
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    limpar_cache(diretorio, tamanho_maximo_mb * 2**20)
+
+def listar_cache(diretorio):
+    # Caminho -> (tamanho, último uso) de todos os arquivos do cache: resultados, assinaturas,
+    # índices (indice_efd) e temporários em gravação; os que somem durante a listagem são ignorados
+    arquivos = {}
     try:
-        return {
-            **pai,
-            'CST Cofins': campos[4],
-            'Vlr Base Cálculo Cofins': campos[6],
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': campos[7],
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': campos[8],
-            'Conta Contábil': campos[9],
-            'Débito/Crédito': '',
-        }
-    except:
-        return {
-            **pai,
-            'CST Cofins': '',
-            'Vlr Base Cálculo Cofins': '',
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': '',
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': '',
-            'Conta Contábil': '',
-            'Débito/Crédito': '',
-        }
-
-def processar_registro_d200(line, cabecalho):
-    campos = line.split('|')
+        entradas = list(os.scandir(diretorio))
+    except FileNotFoundError:
+        return arquivos
+    for entrada in entradas:
+        try:
+            if entrada.is_file():
+                estatistica = entrada.stat()
+                arquivos[entrada.path] = (estatistica.st_size, estatistica.st_mtime)
+        except FileNotFoundError:
+            continue
+    return arquivos
+
+def limpar_cache(diretorio, tamanho_maximo):
+    # Remove as assinaturas sem resultado e os índices de arquivos que não existem mais; depois,
+    # os resultados e índices menos usados até o cache inteiro caber no limite (o mais recente
+    # é mantido). A assinatura de um resultado sai junto com ele; os JSON de controle contam
+    # no tamanho, mas não são removidos.
+    with trava_cache:
+        arquivos = listar_cache(diretorio)
+        for caminho in list(arquivos):
+            if caminho.endswith('.assinatura.npz'):
+                orfao = caminho[:-len('.assinatura.npz')] + '.parquet' not in arquivos
+            elif caminho.endswith('.indice.npz'):
+                origem = origem_indice(caminho)
+                orfao = origem is None or not os.path.exists(origem)
+            else:
+                orfao = False
+            if orfao:
+                remover_do_cache(arquivos, caminho)
+
+        total = sum(tamanho for tamanho, _ in arquivos.values())
+        removiveis = sorted(
+            (caminho for caminho in arquivos if caminho.endswith(('.parquet', '.indice.npz'))),
+            key=lambda caminho: arquivos[caminho][1],
+        )
+        while total > tamanho_maximo and len(removiveis) > 1:
+            caminho = removiveis.pop(0)
+            total -= remover_do_cache(arquivos, caminho)
+            if caminho.endswith('.parquet'):
+                total -= remover_do_cache(arquivos, caminho[:-len('.parquet')] + '.assinatura.npz')
+
+def remover_do_cache(arquivos, caminho):
+    # Remove o arquivo (se ainda existir) e devolve o tamanho que ele ocupava na listagem
+    tamanho, _ = arquivos.pop(caminho, (0, None))
     try:
-        return {
-            **cabecalho,
-            'Registros': 'D200/D205 - Resumo Diário - Nota Fiscal de Serviço de Transporte',
-            'Tipo Operação': define_enumeradores('Tipo Operação', 1),
-            'Situação': '',
-            'Código Participante': '',
-            'CNPJ Participante': '',
-            'CPF Participante': '',
-            'Nome Participante': '',
-            'UF Origem/Destino': '',
-            'Número Documento': campos[6],
-            'Série': campos[4],
-            'Chave NF-e': '',
-            'Data Documento': formatar_data(campos[9]),
-            'Data Entrada/Saída': '',
-            'Vlr Documento': campos[10],
-            'Vlr Desconto NF': campos[11],
-            'Vlr Mercadoria/Operação': '',
-            'Vlr Frete': '',
-            'Vlr ISSQN': '',
-        },campos[8]
-    except Exception as e:
-        print(f"Linha D200 inválida: {line} - {e}")
-        return None
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+    return tamanho
 
-def processar_registro_d201(line, pai, cfop):
-    campos = line.split('|')
-    try:
-        return {
-            **pai,
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': campos[3],
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': '',
-            'CFOP': cfop,
-            'CFOP Faturamento': 'Faturamento',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST': '',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-        },campos[2],campos[4],campos[5],campos[6]
-    except:
-        return {
-            **pai,
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': '',
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': '',
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST': '',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-        },'','','',''
-
-def processar_registro_d205(line, pai, cst_pis, bc_pis, ali_pis, vl_pis):
-    campos = line.split('|')
-    try:
-        return {
-            **pai,
-            'pis/cofins': str(float(vl_pis)+float(campos[6])).replace(".",","),
-            'CST PIS': cst_pis,
-            'Vlr Base Cálculo PIS': bc_pis,
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': ali_pis,
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': vl_pis,
-            'CST Cofins': campos[2],
-            'Vlr Base Cálculo Cofins': campos[4],
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': campos[5],
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': campos[6],
-            'Conta Contábil': campos[7],
-            'Débito/Crédito': '',
-        }
-    except:
-        return {
-            **pai,
-            'pis/cofins': '',
-            'CST PIS': campos[4],
-            'Vlr Base Cálculo PIS': campos[6],
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': campos[7],
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': campos[8],
-            'CST Cofins': '',
-            'Vlr Base Cálculo Cofins': '',
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': '',
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': '',
-            'Conta Contábil': '',
-            'Débito/Crédito': '',
-        }
-
-def processar_registro_d500(line, cabecalho, df_participantes):
-    campos = line.split('|')
-    try:
-        return {
-            **cabecalho,
-            'Registros': 'D500/D505 - Nota Fiscal de Serviço de Comunicação',
-            'Tipo Operação': define_enumeradores('Tipo Operação', int(campos[2])),
-            'Situação': define_enumeradores('Situação',int(campos[6])),
-            'Código Participante': campos[4],
-            'CNPJ Participante': df_participantes[df_participantes['Código'] == campos[4]]['CNPJ'].values[0],
-            'CPF Participante': df_participantes[df_participantes['Código'] == campos[4]]['CPF'].values[0],
-            'Nome Participante': df_participantes[df_participantes['Código'] == campos[4]]['Nome'].values[0],
-            'UF Origem/Destino': define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[4]]['Código Municipio'].values[0][:2]))+"/"+define_enumeradores('UF',int(df_participantes[df_participantes['Código'] == campos[4]]['Código Municipio'].values[0][:2])),
-            'Número Documento': campos[9],
-            'Série': campos[7],
-            'Chave NF-e': '',
-            'Data Documento': formatar_data(campos[10]),
-            'Data Entrada/Saída': formatar_data(campos[11]),
-            'Vlr Documento': campos[12],
-            'Vlr Desconto NF': campos[13],
-            'Vlr Mercadoria/Operação': campos[14],
-            'Vlr Frete': '',
-            'Vlr ISSQN': '',
-        }
-    except Exception as e:
-        print(f"Linha D500 inválida: {line} - {e}")
-        return None
+def ler_estatisticas_cache(diretorio):
+    return ler_json(os.path.join(diretorio, 'estatisticas.json'), {'acertos': 0, 'falhas': 0})
 
-def processar_registro_d501(line, pai):
-    campos = line.split('|')
-    try:
-        return {
-            **pai,
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': campos[3],
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': campos[4],
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST':'',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-            'pis/cofins': '',
-            'CST PIS': campos[2],
-            'Vlr Base Cálculo PIS': campos[5],
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': campos[6],
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': campos[7],
-        }
-    except:
-        return {
-            **pai,
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': '',
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': '',
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST': '',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-            'pis/cofins': '',
-            'CST PIS': '',
-            'Vlr Base Cálculo PIS': '',
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': '',
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': '',
-        }
-
-def processar_registro_d505(line, pai):
-    campos = line.split('|')
-    try:
-        return {
-            **pai,
-            'CST Cofins': campos[2],
-            'Vlr Base Cálculo Cofins': campos[5],
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': campos[6],
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': campos[7],
-            'Conta Contábil': campos[8],
-            'Débito/Crédito': '',
-        }
-    except:
-        return {
-            **pai,
-            'CST Cofins': '',
-            'Vlr Base Cálculo Cofins': '',
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': '',
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': '',
-            'Conta Contábil': '',
-            'Débito/Crédito': '',
-        }
-
-def processar_registro_f100(line, cabecalho):
-    campos = line.split('|')
+def ler_json(caminho, padrao):
     try:
-        return {
-            **cabecalho,
-            'Registros': 'F100 - Demais Documentos e Operações',
-            'Tipo Operação': define_enumeradores('Tipo Operação',1),
-            'Situação': '',
-            'Código Participante': '',
-            'CNPJ Participante': '',
-            'CPF Participante': '',
-            'Nome Participante': '',
-            'UF Origem/Destino': '',
-            'Número Documento': '',
-            'Série': '',
-            'Chave NF-e': '',
-            'Data Documento': formatar_data(campos[5]),
-            'Data Entrada/Saída': '',
-            'Vlr Documento': campos[6],
-            'Vlr Desconto NF': '',
-            'Vlr Mercadoria/Operação': '',
-            'Vlr Frete': '',
-            'Vlr ISSQN': '',
-            'Número Item': '',
-            'Código Item': '',
-            'Descrição Complementar': '',
-            'Descrição Item': '',
-            'NCM': '',
-            'Código Serviço': '',
-            'Código Barra': '',
-            'Tipo Item': '',
-            'Vlr Item': campos[6],
-            'Qtde': '',
-            'Unidade Medida': '',
-            'Vlr Desconto Item': '',
-            'Natureza Crédito': campos[15],
-            'CFOP': '',
-            'CFOP Faturamento': '',
-            'CST ICMS': '',
-            'Vlr Base Cálculo ICMS': '',
-            'Alíquota ICMS': '',
-            'Vlr ICMS': '',
-            'Vlr Base Cálculo ICMS ST': '',
-            'Alíquota ICMS ST': '',
-            'Vlr ICMS ST': '',
-            'CST IPI': '',
-            'Vlr Base Cálculo IPI': '',
-            'Alíquota IPI': '',
-            'Vlr IPI': '',
-            'pis/cofins': str(float(campos[10].replace(",","."))+float(campos[14].replace(",","."))).replace(".",","),
-            'CST PIS': campos[7],
-            'Vlr Base Cálculo PIS': campos[8],
-            'Qtde Base Cálculo PIS': '',
-            'Alíquota PIS': campos[9],
-            'Qtde Alíquota PIS': '',
-            'Vlr PIS': campos[10],
-            'CST Cofins': campos[11],
-            'Vlr Base Cálculo Cofins': campos[12],
-            'Qtde Base Cálculo Cofins': '',
-            'Alíquota Cofins': campos[13],
-            'Qtde Alíquota Cofins': '',
-            'Vlr Cofins': campos[14],
-            'Conta Contábil': campos[17],
-            'Débito/Crédito': '',
-        }
-    except IndexError:
-        print(f"Linha F100 inválida: {line}")
-        return None
-
+        with open(caminho) as arquivo:
+            return json.load(arquivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return padrao
+
+def registrar_estatistica_cache(diretorio, contador):
+    with trava_cache:
+        estatisticas = ler_estatisticas_cache(diretorio)
+        estatisticas[contador] += 1
+        os.makedirs(diretorio, exist_ok=True)
+        with open(os.path.join(diretorio, 'estatisticas.json'), 'w') as arquivo:
+            json.dump(estatisticas, arquivo)
+
+def configurar_colunas():
+    # Formatação de exibição aplicada só na renderização; os dados seguem numéricos
+    config = {coluna: st.column_config.NumberColumn(format="%.2f") for coluna in COLUNAS_VALOR}
+    config.update({coluna: st.column_config.NumberColumn(format="%.4f") for coluna in COLUNAS_ALIQUOTA})
+    config.update({coluna: st.column_config.DateColumn(format="DD/MM/YYYY") for coluna in COLUNAS_DATA})
+    return config
 
 if __name__ == '__main__':
     main()
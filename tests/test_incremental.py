@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+from gerar_efd import contagens_para_linhas, gerar_efd
+from indice_efd import gravar_arrays
+from instrumentacao import Progresso
+from processador_efd import processar_bytes, processar_versao
+
+# O resultado montado pelo reprocessamento incremental (linhas reaproveitadas da versão
+# anterior + documentos alterados) deve ser igual ao processamento completo da nova versão,
+# com ou sem acompanhamento de progresso.
+
+
+def alterar_c170(conteudo, ocorrencia, valor):
+    # Troca o Vlr Item da n-ésima linha C170
+    linhas = conteudo.split(b'\r\n')
+    posicao = [indice for indice, linha in enumerate(linhas) if linha.startswith(b'|C170|')][ocorrencia]
+    campos = linhas[posicao].split(b'|')
+    campos[7] = valor
+    linhas[posicao] = b'|'.join(campos)
+    return b'\r\n'.join(linhas)
+
+def sem_attrs(df):
+    df = df.copy()
+    df.attrs = {}
+    return df
+
+def guardar_versao(df, diretorio):
+    # Como o cache do app: resultado em Parquet e assinatura em .npz
+    assinatura = df.attrs.pop('assinatura')
+    df.attrs.pop('diferenca')
+    caminhos = (os.path.join(diretorio, 'anterior.parquet'), os.path.join(diretorio, 'anterior.npz'))
+    sem_attrs(df).to_parquet(caminhos[0], index=False)
+    gravar_arrays(caminhos[1], assinatura)
+    return caminhos
+
+@pytest.fixture(scope='module')
+def versoes(tmp_path_factory):
+    diretorio = tmp_path_factory.mktemp('versoes')
+    original = diretorio / 'original.txt'
+    gerar_efd(original, contagens_para_linhas(30000))
+    retificadora = diretorio / 'retificadora.txt'
+    retificadora.write_bytes(alterar_c170(original.read_bytes(), 100, b'999,99'))
+    return str(original), str(retificadora)
+
+@pytest.mark.parametrize('a_cada', [None, 20000, 7])
+def test_incremental_igual_ao_completo(versoes, tmp_path, a_cada):
+    original, retificadora = versoes
+
+    def progresso():
+        return Progresso({}, '0', a_cada) if a_cada else None
+
+    anterior = processar_versao(original, progresso=progresso())
+    assert len(anterior) == len(processar_bytes(open(original, 'rb').read()))
+    df = processar_versao(retificadora, guardar_versao(anterior, tmp_path), progresso=progresso())
+
+    completo = processar_bytes(open(retificadora, 'rb').read())
+    assert sum(df.attrs['diferenca']['Novos/alterados']) == 1
+    assert df.attrs['assinatura']['linhas'].sum() == len(df)
+    pd.testing.assert_frame_equal(sem_attrs(df), sem_attrs(completo), check_categorical=False)
+
+def test_progresso_publica_bytes_previstos(versoes):
+    _, retificadora = versoes
+    andamento = {}
+    df = processar_versao(retificadora, progresso=Progresso(andamento, '0', 1000))
+    lidas, lidos, geradas, previstos = andamento['0']
+    assert geradas == len(df)
+    assert 0 < lidos <= previstos <= os.path.getsize(retificadora)
@@ -0,0 +1,50 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+from gerar_efd import contagens_para_linhas, gerar_efd
+from processador_efd import processar_bytes, processar_bytes_paralelo, processar_caminho_paralelo
+
+# O processamento paralelo de um arquivo (trechos por bloco concatenados na ordem)
+# deve ser igual ao sequencial, inclusive quando um bloco não é fechado por |X990|.
+
+
+def sem_attrs(df):
+    df = df.copy()
+    df.attrs = {}
+    return df
+
+def remover_linha(conteudo, marcador):
+    linhas = conteudo.split(b'\r\n')
+    return b'\r\n'.join(linha for linha in linhas if not linha.startswith(marcador))
+
+@pytest.fixture(scope='module')
+def executor():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+@pytest.fixture(scope='module')
+def conteudo(tmp_path_factory):
+    caminho = tmp_path_factory.mktemp('paralelo') / 'efd.txt'
+    gerar_efd(caminho, contagens_para_linhas(20000))
+    return caminho.read_bytes()
+
+@pytest.mark.parametrize('sem_fechamento', [None, b'|A990|', b'|C990|', b'|D990|'])
+def test_paralelo_igual_ao_sequencial(executor, conteudo, tmp_path, sem_fechamento):
+    if sem_fechamento:
+        conteudo = remover_linha(conteudo, sem_fechamento)
+    caminho = tmp_path / 'efd.txt'
+    caminho.write_bytes(conteudo)
+
+    sequencial = processar_bytes(conteudo)
+    for df in (processar_bytes_paralelo(conteudo, executor), processar_caminho_paralelo(str(caminho), executor)):
+        # Somas por trecho: iguais a menos do arredondamento
+        pd.testing.assert_frame_equal(pd.DataFrame(df.attrs['resumo']), pd.DataFrame(sequencial.attrs['resumo']))
+        pd.testing.assert_frame_equal(sem_attrs(df), sem_attrs(sequencial), check_categorical=False)